@@ -1,25 +1,39 @@
 from __future__ import annotations
-from typing import AsyncGenerator, Callable
+import asyncio
+import re
+from typing import Any, AsyncGenerator, Callable
 from agent.events import AgentEvent, AgentEventType
 from agent.session import Session
 from client.response import StreamEventType, ToolCall, ToolResultMessage
-from config.config import Config
+from config.config import Config, ModelPurpose
+from context.compaction import CompactionResult
+from context.file_store import FileReadKey, back_reference
 from prompts.system import create_loop_breaker_prompt
-from tools.base import ToolConfirmation
+from tools.base import ToolConfirmation, ToolResult
+
+# Replies that close a step without asking for anything further.
+ACKNOWLEDGEMENT = re.compile(
+    r"\b(?:thanks|thank you|thx|ty|ok|okay|got it|cool|great|nice|perfect|awesome|sounds good|makes sense)\b"
+)
+
+
 class Agent:
     def __init__(self,config:Config,confirmation_callback: Callable[[ToolConfirmation], bool] | None = None,):
         self.config = config
         self.session:Session|None = Session(config=self.config)
         self.session.approval_manager.confirmation_callback = confirmation_callback
+        self._tool_progress:asyncio.Queue[AgentEvent] = asyncio.Queue()
+        self._tool_schemas:list[dict[str,Any]]|None = None
 
     async def run(self, message:str):
         await self.session.hook_system.trigger_before_agent(message)
         yield AgentEvent.agent_start(message)
 
+        first_turn_purpose = self._first_turn_purpose(message)
         self.session.context_manager.add_user_message(message)
 
         final_response:str|None = None
-        async for event in self._agentic_loop():
+        async for event in self._agentic_loop(first_turn_purpose):
             yield event
             if event.type == AgentEventType.TEXT_COMPLETE:
                 final_response = event.data.get("content")
@@ -28,122 +42,359 @@ class Agent:
 
         
 
-    async def _agentic_loop(self)->AsyncGenerator[AgentEvent,None]:
+    def _first_turn_purpose(self,message:str)->ModelPurpose:
+        """Route a bare acknowledgement, like "thanks" or "ok, got it", to the fast model.
+
+        Anything that may ask for more work stays on the main model, including
+        an "ok" that answers a question from the assistant. Only the reply to
+        the message itself is routed; once tools have run, the following turns
+        go back to the main model.
+        """
+        models = self.config.models
+        if not models.route_short_turns or not models.fast:
+            return ModelPurpose.MAIN
+        text = message.strip().lower()
+        if len(text) > models.short_turn_max_chars or "\n" in text:
+            return ModelPurpose.MAIN
+        if re.search(r"[a-z0-9]",ACKNOWLEDGEMENT.sub("",text)):
+            return ModelPurpose.MAIN
+
+        last_reply = next(
+            (msg for msg in reversed(self.session.context_manager.messages) if msg.role == "assistant"),
+            None,
+        )
+        if last_reply is None:
+            # The opening request of a session sets up the whole task.
+            return ModelPurpose.MAIN
+        if (last_reply.content or "").rstrip().endswith("?"):
+            # "ok" to "Should I also update the tests?" approves more work.
+            return ModelPurpose.MAIN
+        return ModelPurpose.FAST
+
+    async def _agentic_loop(self,first_turn_purpose:ModelPurpose=ModelPurpose.MAIN)->AsyncGenerator[AgentEvent,None]:
         max_turns = self.config.max_turns
         for turn in range(max_turns):
             self.session.increment_turn()
             response_text = ""
 
-            if self.session.context_manager.needs_compression():
-                summary, usage = await self.session.chat_compactor.compress(
-                    self.session.context_manager
-                )
+            tool_schemas = self.session.tool_registry.get_schemas()
+            if tool_schemas is not self._tool_schemas:
+                # MCP servers or discovered tools changed the available set.
+                self.session.context_manager.set_tool_schemas(tool_schemas)
+                self._tool_schemas = tool_schemas
 
-                if summary:
-                    self.session.context_manager.replace_with_summary(summary)
-                    self.session.context_manager.set_latest_usage(usage)
-                    self.session.context_manager.add_usage(usage)
+            await self._compact_context()
+
+            # Calls started while the stream is still arriving, by call id.
+            early_tasks:dict[str,asyncio.Task[ToolResult]] = {}
+            try:
+                tool_calls:list[ToolCall] = []
+                semaphore = asyncio.Semaphore(self.config.max_parallel_tool_calls)
 
-            tool_schemas = self.session.tool_registry.get_schema()
-            tool_calls:list[ToolCall] = []
-
-            async for event in self.session.client.chat_completion(self.session.context_manager.get_messages(),tools=tool_schemas if tool_schemas else None,stream=True):
-                if event.type == StreamEventType.TEXT_DELTA:
-                    if event.text_delta:
-                        content = event.text_delta.content
-                        response_text+=content
-                        yield AgentEvent.text_delta(content)
-                elif event.type==StreamEventType.TOOL_CALL_COMPLETE:
-                    if event.tool_call:
-                        tool_calls.append(event.tool_call)
-                elif event.type == StreamEventType.ERROR:
-                    yield AgentEvent.agent_error(event.error or "Unknown error occured.")
-                elif event.type == StreamEventType.MESSAGE_COMPLETE:
-                    usage = event.usage
+                async for event in self.session.client.chat_completion(
+                    self.session.context_manager.get_messages(),
+                    tools=tool_schemas if tool_schemas else None,
+                    stream=True,
+                    estimated_prompt_tokens=self.session.context_manager.estimated_tokens,
+                    purpose=first_turn_purpose if turn == 0 else ModelPurpose.MAIN,
+                ):
+                    if event.type == StreamEventType.TEXT_DELTA:
+                        if event.text_delta:
+                            content = event.text_delta.content
+                            response_text+=content
+                            yield AgentEvent.text_delta(content)
+                    elif event.type==StreamEventType.TOOL_CALL_COMPLETE:
+                        if event.tool_call:
+                            tool_calls.append(event.tool_call)
+                            self._dispatch_early(tool_calls,semaphore,early_tasks)
+                    elif event.type == StreamEventType.ERROR:
+                        yield AgentEvent.agent_error(event.error or "Unknown error occured.")
+                    elif event.type == StreamEventType.MESSAGE_COMPLETE:
+                        usage = event.usage
 
             
-            self.session.context_manager.add_assistant_message(
-                response_text or None,
-                [
-                    {
-                        "id":tc.call_id,
-                        "type":"function",
-                        "function":{
-                            "name":tc.name,
-                            "arguments":tc.arguments
+                self.session.context_manager.add_assistant_message(
+                    response_text or None,
+                    [
+                        {
+                            "id":tc.call_id,
+                            "type":"function",
+                            "function":{
+                                "name":tc.name,
+                                "arguments":tc.arguments
+                            }
                         }
-                    }
-                    for tc in tool_calls
-                ] if tool_calls else None
-            )
+                        for tc in tool_calls
+                    ] if tool_calls else None
+                )
+
+                if not tool_calls:
+                    if usage:
+                        self.session.context_manager.set_latest_usage(usage)
+                        self.session.context_manager.add_usage(usage)
+
+                    self.session.context_manager.prune_tool_outputs()
+                    return
+            
+                tool_call_results:list[ToolResultMessage] = []
+                file_reads:dict[str,FileReadKey] = {}
 
-            if not tool_calls:
+                for batch in self._batch_tool_calls(tool_calls):
+                    for tool_call in batch:
+                        yield AgentEvent.tool_call_start(
+                            tool_call.call_id,
+                            tool_call.name,
+                            tool_call.arguments
+                        )
+                        self.session.loop_detector.record_action(
+                            "tool_call",
+                            tool_name=tool_call.name,
+                            args=tool_call.arguments,
+                        )
+
+                    if len(batch) == 1:
+                        pending = asyncio.ensure_future(self._collect_result(batch[0],early_tasks))
+                    else:
+                        pending = asyncio.ensure_future(asyncio.gather(
+                            *(self._collect_result(tool_call,early_tasks,semaphore) for tool_call in batch)
+                        ))
+                    async for event in self._tool_progress_events(pending):
+                        yield event
+                    results = [pending.result()] if len(batch) == 1 else pending.result()
+
+                    for tool_call, result in zip(batch,results):
+                        yield AgentEvent.tool_call_complete(
+                            tool_call.call_id,
+                            tool_call.name,
+                            result
+                        )
+
+                        tool_call_results.append(
+                            ToolResultMessage(
+                                tool_call_id=tool_call.call_id,
+                                content=result.to_model_output(),
+                                is_error=not result.success,
+                            )
+                        )
+                        key = self._file_read_key(tool_call,result)
+                        if key:
+                            file_reads[tool_call.call_id] = key
+
+                # Added together so their tokens are counted in one batch.
+                contents:dict[str,str] = {}
+                for tool_result in tool_call_results:
+                    contents[tool_result.tool_call_id] = self._dedupe_file_read(
+                        tool_result,
+                        file_reads.get(tool_result.tool_call_id),
+                        contents,
+                    )
+                self.session.context_manager.add_tool_results(list(contents.items()))
+
+                loop_detection_error = self.session.loop_detector.check_for_loop()
+                if loop_detection_error:
+                    loop_prompt = create_loop_breaker_prompt(loop_detection_error)
+                    self.session.context_manager.add_user_message(loop_prompt)
+            
                 if usage:
                     self.session.context_manager.set_latest_usage(usage)
                     self.session.context_manager.add_usage(usage)
 
                 self.session.context_manager.prune_tool_outputs()
-                return
-            
-            tool_call_results:list[ToolResultMessage] = []
+            finally:
+                # An interrupted turn or a failed stream leaves calls nobody collects.
+                await self._cancel_early_tasks(early_tasks)
+        yield AgentEvent.agent_error(f"Maximum turns ({max_turns}) reached")
 
-            for tool_call in tool_calls:
-                yield AgentEvent.tool_call_start(
-                    tool_call.call_id,
-                    tool_call.name,
-                    tool_call.arguments
-                )
-                self.session.loop_detector.record_action(
-                    "tool_call",
-                    tool_name=tool_call.name,
-                    args=tool_call.arguments,
-                )
+    async def _compact_context(self)->None:
+        context_manager = self.session.context_manager
+        compactor = self.session.chat_compactor
+        compaction_config = self.config.compaction
 
-                result = await self.session.tool_registry.invoke(
-                    tool_call.name,
-                    tool_call.arguments,
-                    self.config.cwd,
-                    self.session.hook_system,
-                    self.session.approval_manager,
-                )
-                
-                yield AgentEvent.tool_call_complete(
-                    tool_call.call_id,
-                    tool_call.name,
-                    result
-                )
+        # Turn boundary: swap in a finished background summary first.
+        result = compactor.take_background_result(context_manager)
+        if result:
+            await self._apply_compaction(result)
 
-                tool_call_results.append(
-                    ToolResultMessage(
-                        tool_call_id=tool_call.call_id,
-                        content=result.to_model_output(),
-                        is_error=not result.success,
-                    )
-                )
+        plan = self.session.budget_planner.plan(context_manager)
+        self.session.budget_planner.apply(plan,context_manager)
 
-            for tool_result in tool_call_results:
-                self.session.context_manager.add_tool_result(
-                    tool_result.tool_call_id,
-                    tool_result.content
-                )
+        if plan.needs_summary or context_manager.needs_compression():
+            if compactor.background_running:
+                result = await compactor.wait_background(context_manager)
+                if result:
+                    await self._apply_compaction(result)
 
-            loop_detection_error = self.session.loop_detector.check_for_loop()
-            if loop_detection_error:
-                loop_prompt = create_loop_breaker_prompt(loop_detection_error)
-                self.session.context_manager.add_user_message(loop_prompt)
-            
+        if plan.needs_summary or context_manager.needs_compression():
+            # Over budget: summarize everything except the protected recent steps.
+            result = await compactor.compress(context_manager,fraction=1.0)
+            if result:
+                await self._apply_compaction(result)
+        elif (
+            compaction_config.background
+            and not compactor.background_running
+            and context_manager.needs_compression(compaction_config.soft_threshold)
+        ):
+            if not compactor.compact_locally(context_manager,compaction_config.soft_threshold):
+                compactor.start_background(context_manager)
+
+    async def _apply_compaction(self,result:CompactionResult)->None:
+        context_manager = self.session.context_manager
+        context_manager.replace_with_summary(result.summary,result.upto)
+        context_manager.set_latest_usage(result.usage)
+        context_manager.add_usage(result.usage)
+
+        if len(context_manager.summaries) > self.config.compaction.max_summary_chain:
+            usage = await self.session.chat_compactor.merge_summaries(context_manager)
             if usage:
-                self.session.context_manager.set_latest_usage(usage)
-                self.session.context_manager.add_usage(usage)
+                context_manager.add_usage(usage)
 
-            self.session.context_manager.prune_tool_outputs()
-        yield AgentEvent.agent_error(f"Maximum turns ({max_turns}) reached")
+    def _file_read_key(self,tool_call:ToolCall,result:ToolResult)->FileReadKey|None:
+        if tool_call.name != "read_file" or not result.success:
+            return None
+        if not self.session.config.dedupe_file_reads:
+            return None
+
+        metadata = result.metadata or {}
+        if "mtime_ns" not in metadata or "content_hash" not in metadata:
+            return None
+        return FileReadKey(
+            path=metadata["path"],
+            mtime_ns=metadata["mtime_ns"],
+            content_hash=metadata["content_hash"],
+        )
+
+    def _dedupe_file_read(self,tool_result:ToolResultMessage,key:FileReadKey|None,turn_contents:dict[str,str])->str:
+        if key is None:
+            return tool_result.content
+
+        store = self.session.file_read_store
+        previous = store.lookup(key)
+        # The earlier copy only counts while it is still in the history
+        # verbatim, or about to be added from this turn; pruning or
+        # compaction may have removed it since.
+        if previous and (
+            turn_contents.get(previous) == tool_result.content
+            or self.session.context_manager.has_tool_result(previous,tool_result.content)
+        ):
+            return back_reference(previous,key.path)
+
+        store.record(key,tool_result.tool_call_id)
+        return tool_result.content
+
+    def _is_parallel_safe(self,tool_call:ToolCall)->bool:
+        tool = self.session.tool_registry.get(tool_call.name)
+        if tool is None:
+            return False
+
+        # Read-kind tools are non-mutating by default; tools such as subagents
+        # override is_mutating to opt out even when their kind is READ.
+        return not tool.is_mutating(tool_call.arguments)
+
+    def _batch_tool_calls(self,tool_calls:list[ToolCall])->list[list[ToolCall]]:
+        if not self.config.parallel_tool_calls:
+            return [[tool_call] for tool_call in tool_calls]
+
+        # Consecutive read-only calls share a batch; every mutating call gets
+        # its own so it still observes the effects of the calls before it.
+        batches:list[list[ToolCall]] = []
+        current:list[ToolCall] = []
+        for tool_call in tool_calls:
+            if self._is_parallel_safe(tool_call):
+                current.append(tool_call)
+                continue
+
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([tool_call])
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def _dispatch_early(
+        self,
+        tool_calls:list[ToolCall],
+        semaphore:asyncio.Semaphore,
+        early_tasks:dict[str,asyncio.Task[ToolResult]],
+    )->None:
+        if not (self.config.parallel_tool_calls and self.config.early_tool_dispatch):
+            return
+
+        # Only start a call early while every call before it in this turn is
+        # read-only, otherwise it could observe state from before a write.
+        if not all(self._is_parallel_safe(tool_call) for tool_call in tool_calls):
+            return
+
+        tool_call = tool_calls[-1]
+        early_tasks[tool_call.call_id] = asyncio.create_task(
+            self._invoke_tool(tool_call,semaphore)
+        )
+
+    async def _collect_result(
+        self,
+        tool_call:ToolCall,
+        early_tasks:dict[str,asyncio.Task[ToolResult]],
+        semaphore:asyncio.Semaphore|None=None,
+    )->ToolResult:
+        task = early_tasks.pop(tool_call.call_id,None)
+        if task is not None:
+            return await task
+
+        return await self._invoke_tool(tool_call,semaphore)
+
+    async def _cancel_early_tasks(self,early_tasks:dict[str,asyncio.Task[ToolResult]])->None:
+        for task in early_tasks.values():
+            task.cancel()
+        # Wait for them so they stop touching the workspace and their
+        # errors are retrieved.
+        await asyncio.gather(*early_tasks.values(),return_exceptions=True)
+        early_tasks.clear()
+
+    async def _tool_progress_events(self,pending:asyncio.Future)->AsyncGenerator[AgentEvent,None]:
+        """Progress of the running tool calls, until pending is done."""
+        getter:asyncio.Future|None = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(self._tool_progress.get())
+                done,_ = await asyncio.wait({pending,getter},return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    break
+                yield getter.result()
+
+            while not self._tool_progress.empty():
+                yield self._tool_progress.get_nowait()
+        finally:
+            if getter is not None:
+                getter.cancel()
+            if not pending.done():
+                pending.cancel()
+
+    async def _invoke_tool(self,tool_call:ToolCall,semaphore:asyncio.Semaphore|None=None)->ToolResult:
+        if semaphore is None:
+            return await self.session.tool_registry.invoke(
+                tool_call.name,
+                tool_call.arguments,
+                self.config.cwd,
+                self.session.hook_system,
+                self.session.approval_manager,
+                on_progress=lambda progress:self._tool_progress.put_nowait(
+                    AgentEvent.tool_call_progress(tool_call.call_id,tool_call.name,progress.output)
+                ),
+            )
+
+        async with semaphore:
+            return await self._invoke_tool(tool_call)
             
     async def __aenter__(self)->Agent:
             await self.session.initialize()
             return self
         
     async def __aexit__(self,exp_val,exp_type,exp_tb)->None:
+            if self.session:
+                self.session.chat_compactor.cancel_background()
+
             if self.session and self.session.client:
                 await self.session.client.close()     
                 self.session  = None
\ No newline at end of file
@@ -16,6 +16,7 @@ class AgentEventType(str,Enum):
 
     #tool calls
     TOOL_CALL_START = "tool_call_start"
+    TOOL_CALL_PROGRESS = "tool_call_progress"
     TOOL_CALL_COMPLETE = "tool_call_complete"
 
 
@@ -70,6 +71,17 @@ class AgentEvent:
             }
         )
     
+    @classmethod
+    def tool_call_progress(cls,call_id:str,name:str,output:str):
+        return cls(
+            type=AgentEventType.TOOL_CALL_PROGRESS,
+            data={
+                'call_id':call_id,
+                'name':name,
+                'output':output,
+            }
+        )
+    
     @classmethod
     def tool_call_complete(cls,call_id:str,name:str,result:ToolResult):
         return cls(
@@ -5,7 +5,9 @@ import uuid
 from client.llm_client import LLMClient
 from config.config import Config
 from config.loader import get_data_dir
+from context.budget import ContextBudgetPlanner
 from context.compaction import ChatCompactor
+from context.file_store import FileReadStore
 from context.manager import ContextManager
 from hooks.hook_system import HookSystem
 from safety.approval import ApprovalManager
@@ -36,6 +38,8 @@ class Session:
         self.updated_at = datetime.now()  
         self.mcp_manager = MCPManager(self.config)
         self.chat_compactor = ChatCompactor(self.client)
+        self.budget_planner = ContextBudgetPlanner(self.config)
+        self.file_read_store = FileReadStore()
         self.loop_detector = LoopDetector()
 
         self.turn_count = 0
@@ -88,6 +92,13 @@ class Session:
             "turn_count": self.turn_count,
             "message_count": self.context_manager.message_count,
             "token_usage": self.context_manager.total_usage,
+            "context_tokens": self.context_manager.ledger.to_dict(),
+            "context_budget": self.budget_planner.metrics.to_dict(),
+            "prompt_cache": {
+                "cached_tokens": self.context_manager.total_usage.cached_tokens,
+                "hit_ratio": round(self.context_manager.total_usage.cache_hit_ratio, 3),
+                "last_hit_ratio": round(self.context_manager.latest_usage.cache_hit_ratio, 3),
+            },
             "tools_count": len(self.tool_registry.get_tools()),
             "mcp_servers": len(self.tool_registry.connected_mcp_servers),
         }
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import json
+import re
+from typing import Any
+from client.response import parse_tool_call_arguments
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'[{}\[\]":,]')
+_WHITESPACE = " \t\r\n"
+
+
+class ToolArgumentsBuffer:
+    """Assembles streamed tool-call argument chunks.
+
+    Chunks are kept in a list and scanned once as they arrive, so the total
+    cost stays linear in the argument size. The scanner tracks nesting and
+    string state to report when the top-level object closes, and decodes
+    small top-level fields (such as ``path``) as soon as their value ends.
+    """
+
+    MAX_FIELD_CHARS = 4096
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._length = 0
+        self._joined: str | None = None
+
+        self._depth = 0
+        self._started = False
+        self._complete = False
+        self._in_string = False
+        self._escape = False
+        # What the top-level object expects next: key, colon, value or comma.
+        self._expect = "key"
+
+        self._key: str | None = None
+        self._capture: list[str] | None = None
+        self._capture_size = 0
+        self._capture_kind: str | None = None
+        self._fields: dict[str, Any] = {}
+        self._new_fields = False
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def is_complete(self) -> bool:
+        return self._complete
+
+    @property
+    def partial_fields(self) -> dict[str, Any]:
+        return dict(self._fields)
+
+    def pop_new_fields(self) -> bool:
+        new_fields = self._new_fields
+        self._new_fields = False
+        return new_fields
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._joined = None
+
+        if not self._complete:
+            self._scan(chunk)
+
+    def getvalue(self) -> str:
+        if self._joined is None:
+            self._joined = "".join(self._chunks)
+            self._chunks = [self._joined]
+        return self._joined
+
+    def parse(self) -> dict[str, Any]:
+        return parse_tool_call_arguments(self.getvalue())
+
+    def _scan(self, chunk: str) -> None:
+        i = 0
+        n = len(chunk)
+        capture_start = 0
+
+        while i < n and not self._complete:
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(chunk, i)
+                if match is None:
+                    i = n
+                    break
+
+                i = match.start()
+                if chunk[i] == "\\":
+                    self._escape = True
+                    i += 1
+                    continue
+
+                self._in_string = False
+                i += 1
+                if self._depth == 1 and self._capture_kind in ("key", "string"):
+                    capture_start = self._finish_capture(chunk, capture_start, i)
+                continue
+
+            if self._depth == 1 and self._expect == "value":
+                char = chunk[i]
+                if char in _WHITESPACE:
+                    i += 1
+                    continue
+
+                capture_start = i
+                self._begin_capture("literal")
+                self._expect = "comma"
+                if char == '"':
+                    self._capture_kind = "string"
+                    self._in_string = True
+                    i += 1
+                    continue
+                if char in "{[":
+                    self._capture_kind = "nested"
+                    self._depth += 1
+                    i += 1
+                    continue
+                i += 1
+                continue
+
+            match = _STRUCTURAL.search(chunk, i)
+            if match is None:
+                i = n
+                break
+
+            i = match.start()
+            char = chunk[i]
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    capture_start = i
+                    self._begin_capture("key")
+                    self._expect = "colon"
+                i += 1
+            elif char in "{[":
+                if not self._started:
+                    self._started = True
+                self._depth += 1
+                i += 1
+            elif char in "}]":
+                if self._depth == 1 and self._capture_kind == "literal":
+                    capture_start = self._finish_capture(chunk, capture_start, i)
+                self._depth -= 1
+                i += 1
+                if self._depth == 1 and self._capture_kind == "nested":
+                    capture_start = self._finish_capture(chunk, capture_start, i)
+                elif self._depth == 0 and self._started:
+                    self._complete = True
+            elif self._depth == 1 and char == ":":
+                self._expect = "value"
+                i += 1
+            elif self._depth == 1 and char == ",":
+                if self._capture_kind == "literal":
+                    capture_start = self._finish_capture(chunk, capture_start, i)
+                self._expect = "key"
+                i += 1
+            else:
+                i += 1
+
+        if self._capture is not None:
+            self._append_capture(chunk[capture_start:])
+
+    def _begin_capture(self, kind: str) -> None:
+        self._capture = []
+        self._capture_size = 0
+        self._capture_kind = kind
+
+    def _append_capture(self, text: str) -> None:
+        if self._capture is None or not text:
+            return
+
+        self._capture_size += len(text)
+        if self._capture_size > self.MAX_FIELD_CHARS:
+            # Large values (file contents) are only decoded once, at the end.
+            self._capture = None
+            return
+        self._capture.append(text)
+
+    def _finish_capture(self, chunk: str, start: int, end: int) -> int:
+        kind = self._capture_kind
+        self._append_capture(chunk[start:end])
+        capture = self._capture
+        self._capture = None
+        self._capture_kind = None
+
+        if capture is None:
+            if kind == "key":
+                self._key = None
+            return end
+
+        try:
+            value = json.loads("".join(capture))
+        except json.JSONDecodeError:
+            return end
+
+        if kind == "key":
+            self._key = value if isinstance(value, str) else None
+        elif self._key is not None:
+            self._fields[self._key] = value
+            self._new_fields = True
+            self._key = None
+
+        return end
@@ -1,28 +1,65 @@
 import asyncio
+import logging
+import random
+import time
 from typing import Any, AsyncGenerator
+import httpx
 from openai import AsyncOpenAI
 from openai import RateLimitError, APIConnectionError, APIError
+from client.json_stream import ToolArgumentsBuffer
+from client.rate_limiter import RateLimiter, get_rate_limiter
+from client.response_cache import RecordingStream, ResponseCache, get_response_cache, request_key
+from client.retry import RetryPolicy, StreamDivergedError
+from client.router import Endpoint, EndpointRouter
+from client.transport import get_http_client
 from client.response import StreamEventType, StreamEvent, TextDelta, TokenUsage, ToolCall, ToolCallDelta, parse_tool_call_arguments
-from config.config import Config
+from config.config import Config, ModelPurpose, ResponseCacheMode
+from utils.text import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
 
 class LLMClient:
+    TOOL_CALL_EVENTS = {
+        StreamEventType.TOOL_CALL_START,
+        StreamEventType.TOOL_CALL_DELTA,
+        StreamEventType.TOOL_CALL_COMPLETE,
+    }
+
     def __init__(self,config:Config)->None:
-        self._client :AsyncOpenAI | None = None
-        self._max_retries : int  = 3
+        self._clients : dict[str,AsyncOpenAI] = {}
         self.config = config
+        self.retry_policy = RetryPolicy(config.retry)
+        self.router = EndpointRouter(config)
+        # Last schema list seen and its wire format; the registry hands out
+        # the same list until its tools change.
+        self._tools_cache : tuple[list[dict[str,Any]],list[dict[str,Any]]] | None = None
 
-    def get_client(self) -> AsyncOpenAI:
-        if self._client is None:
-            self._client = AsyncOpenAI( api_key=self.config.api_key,base_url=self.config.base_url,)
-        return self._client
+    def get_client(self,endpoint:Endpoint|None=None) -> AsyncOpenAI:
+        endpoint = endpoint or self.router.endpoints[0]
+        client = self._clients.get(endpoint.key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=endpoint.api_key,
+                base_url=endpoint.base_url,
+                http_client=get_http_client(self.config.http),
+                # Retries are handled by retry_policy.
+                max_retries=0,
+            )
+            self._clients[endpoint.key] = client
+        return client
 
     async def close(self)->None:
-        if self._client:
-            await self._client.close()
-            self._client = None
+        # The HTTP pool is shared by every client in the process and is
+        # closed once on shutdown by close_http_clients.
+        self._clients.clear()
 
     def _build_tools(self, tools: list[dict[str, Any]]):
-        return [
+        if self._tools_cache is not None and self._tools_cache[0] is tools:
+            return self._tools_cache[1]
+
+        payload = [
             {
                 "type": "function",
                 "function": {
@@ -39,59 +76,318 @@ class LLMClient:
             }
             for tool in tools
         ]
+        self._tools_cache = (tools, payload)
+        return payload
 
 
-    async def chat_completion(self, messages: list[dict[str,Any]],tools:list[dict[str,Any]]|None=None,stream:bool=True)->AsyncGenerator[StreamEvent,None]:
-        client = self.get_client()
+    async def chat_completion(self, messages: list[dict[str,Any]],tools:list[dict[str,Any]]|None=None,stream:bool=True,estimated_prompt_tokens:int|None=None,purpose:ModelPurpose=ModelPurpose.MAIN)->AsyncGenerator[StreamEvent,None]:
         kwargs = {
-            "model":self.config.model.name,
             "messages":messages,
             "stream":stream
         }
 
+        # A tier model replaces both model.name and per-endpoint models.
+        tier_model = self.config.model_tier(purpose)
+        if tier_model:
+            kwargs["model"] = tier_model
+
         if tools:
             kwargs['tools'] = self._build_tools(tools)
             kwargs["tool_choice"] = "auto"
 
-        for attempt in range(self._max_retries+1):
-            try:
-                if stream:
-                    async for event in self._stream_response(client,kwargs):
-                        yield event
-                else:
-                    event = await self._non_stream_response(client,kwargs)
-                    yield event
-                break
-            except RateLimitError as e:
-                if attempt<self._max_retries:
-                    wait_time = 2**attempt
-                    await asyncio.sleep(wait_time)
+        cache = get_response_cache(self.config.response_cache)
+        if cache is None:
+            events = self._live_completion(kwargs,estimated_prompt_tokens)
+        else:
+            events = self._cached_completion(cache,kwargs,estimated_prompt_tokens)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
 
-                else:
+    async def _cached_completion(self,cache:ResponseCache,kwargs:dict[str,Any],estimated_prompt_tokens:int|None)->AsyncGenerator[StreamEvent,None]:
+        mode = self.config.response_cache.mode
+        key = request_key({"model":self.config.model.name,**kwargs},self.config.model.temperature)
+
+        recording = cache.get(key) if mode != ResponseCacheMode.RECORD else None
+        if recording is None and mode == ResponseCacheMode.REPLAY and not self.config.response_cache.replay_strict:
+            recording = cache.next_unplayed()
+            if recording is not None:
+                logger.warning("No recording matches request %s, replaying the next one in order",key[:12])
+        if recording is not None:
+            for delay, event in recording:
+                if self.config.response_cache.replay_timing and delay>0:
+                    await asyncio.sleep(delay)
+                yield event
+            return
+
+        if mode == ResponseCacheMode.REPLAY:
+            yield StreamEvent(
+                type=StreamEventType.ERROR,
+                error=f"No recorded response for this request (key {key[:12]}) in {cache.path}"
+            )
+            return
+
+        recorder = RecordingStream()
+        failed = False
+        events = self._live_completion(kwargs,estimated_prompt_tokens)
+        try:
+            async for event in events:
+                recorder.add(event)
+                failed = failed or event.type == StreamEventType.ERROR
+                yield event
+        finally:
+            await events.aclose()
+        # Only complete answers are stored; errors are retried next time.
+        if not failed and recorder.events and recorder.events[-1][1].type == StreamEventType.MESSAGE_COMPLETE:
+            cache.put(key,recorder.events)
+
+    async def _live_completion(self,kwargs:dict[str,Any],estimated_prompt_tokens:int|None)->AsyncGenerator[StreamEvent,None]:
+        rate_limit = self.config.rate_limit
+        if estimated_prompt_tokens is None and (rate_limit.requests_per_minute or rate_limit.tokens_per_minute):
+            estimated_prompt_tokens = self._estimate_prompt_tokens(kwargs["messages"])
+        attempt = 0
+        delay : float | None = None
+        # Output already yielded to the caller. A retried stream has to
+        # reproduce it before anything new is passed on.
+        emitted_text = ""
+        emitted_tool_calls = False
+        # Endpoints that failed this request; retries go elsewhere first.
+        failed : set[str] = set()
+
+        while True:
+            candidates = self.router.candidates(failed)
+            endpoint = next((e for e in candidates if e.breaker.allow()),None)
+            if endpoint is None:
+                if attempt>=self.retry_policy.max_retries:
                     yield StreamEvent(
                         type=StreamEventType.ERROR,
-                        error=f"Rate limit exceeded:{e}"
+                        error="Provider unavailable: too many recent failures, try again shortly"
                     )
                     return
-            except APIConnectionError as e:
-                if attempt<self._max_retries:
-                    wait_time = 2**attempt
-                    await asyncio.sleep(wait_time)
+                attempt += 1
+                await asyncio.sleep(self.router.retry_in()+random.uniform(0,self.config.retry.base_delay))
+                continue
+
+            replay = emitted_text
+            events : AsyncGenerator[StreamEvent,None] | None = None
+            try:
+                if kwargs["stream"]:
+                    hedges = [e for e in candidates if e is not endpoint] if self.config.routing.hedge else []
+                    endpoint, events = await self._start_stream(endpoint,hedges,kwargs,estimated_prompt_tokens)
+                    async for event in events:
+                        if replay:
+                            event, replay = self._skip_replayed(event,replay)
+                            if event is None:
+                                continue
 
+                        if event.type == StreamEventType.TEXT_DELTA:
+                            emitted_text += event.text_delta.content
+                        elif event.type in self.TOOL_CALL_EVENTS:
+                            emitted_tool_calls = True
+                        yield event
                 else:
+                    yield await self._non_stream_endpoint(endpoint,kwargs,estimated_prompt_tokens)
+                endpoint.breaker.record_success()
+                return
+            except (APIError,httpx.TransportError,StreamDivergedError) as e:
+                self._record_outcome(endpoint,e)
+                failed.add(endpoint.key)
+                retryable = self.retry_policy.is_retryable(e)
+                if not retryable or attempt>=self.retry_policy.max_retries or emitted_tool_calls:
                     yield StreamEvent(
                         type=StreamEventType.ERROR,
-                        error=f"Connection error:{e}"
+                        error=self._error_message(e)
                     )
                     return
-            except APIError as e:
-                yield StreamEvent(
-                    type=StreamEventType.ERROR,
-                    error=f"API error:{e}"
-                )
-                return
 
-        return
+                attempt += 1
+                if any(c.key not in failed for c in self.router.candidates()):
+                    # Another endpoint is available; fail over without waiting.
+                    logger.warning("LLM request to %s failed (%s), failing over (attempt %d/%d)",endpoint.name,e,attempt,self.retry_policy.max_retries)
+                    continue
+                delay = self.retry_policy.next_delay(delay,e)
+                logger.warning("LLM request to %s failed (%s), retrying in %.1fs (attempt %d/%d)",endpoint.name,e,delay,attempt,self.retry_policy.max_retries)
+                await asyncio.sleep(delay)
+            finally:
+                if events is not None:
+                    await events.aclose()
+
+    def _record_outcome(self,endpoint:Endpoint,error:BaseException)->None:
+        if self.retry_policy.is_retryable(error):
+            endpoint.breaker.record_failure()
+        elif not isinstance(error,StreamDivergedError):
+            endpoint.breaker.record_success()
+
+    def _request_for(self,endpoint:Endpoint,kwargs:dict[str,Any])->dict[str,Any]:
+        return {"model":endpoint.model or self.config.model.name,**kwargs}
+
+    async def _start_stream(self,primary:Endpoint,hedges:list[Endpoint],kwargs:dict[str,Any],estimated_prompt_tokens:int|None)->tuple[Endpoint,AsyncGenerator[StreamEvent,None]]:
+        """Open a stream on primary, hedging to another endpoint if it is slow.
+
+        If no event arrives within the hedge delay of primary's rate limiter
+        admitting the request, the same request is sent to the first healthy
+        endpoint in hedges, which reserves on its own limiter only then. Whichever stream produces
+        an event first is returned; the other is cancelled.
+        """
+        racers : dict[asyncio.Future,tuple[Endpoint,AsyncGenerator[StreamEvent,None],float]] = {}
+        failures : list[tuple[Endpoint,BaseException]] = []
+
+        def start(endpoint:Endpoint,admitted:asyncio.Event|None=None)->asyncio.Future:
+            events = self._endpoint_stream(endpoint,kwargs,estimated_prompt_tokens,admitted)
+            task = asyncio.ensure_future(anext(events))
+            racers[task] = (endpoint,events,time.monotonic())
+            return task
+
+        admitted = asyncio.Event()
+        primary_task = start(primary,admitted)
+        timeout = None
+        winner : tuple[Endpoint,AsyncGenerator[StreamEvent,None],StreamEvent|None] | None = None
+        try:
+            if hedges:
+                # Time spent queued in the primary's rate limiter is not a
+                # slow first token, so the hedge delay starts on admission.
+                waiter = asyncio.ensure_future(admitted.wait())
+                try:
+                    await asyncio.wait({waiter,primary_task},return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if primary_task in racers:
+                    racers[primary_task] = (*racers[primary_task][:2],time.monotonic())
+                timeout = self.router.hedge_delay(primary)
+
+            while racers and winner is None:
+                done, _ = await asyncio.wait(racers,timeout=timeout,return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    timeout = None
+                    hedge = next((e for e in hedges if e.breaker.allow()),None)
+                    if hedge is not None:
+                        logger.info("No response from %s yet, hedging request to %s",primary.name,hedge.name)
+                        start(hedge)
+                    continue
+
+                for task in done:
+                    endpoint, events, _ = racers.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except (APIError,httpx.TransportError) as e:
+                        failures.append((endpoint,e))
+                        await events.aclose()
+                        continue
+                    if winner is None:
+                        winner = (endpoint,events,first)
+                    else:
+                        await events.aclose()
+        finally:
+            for task,(endpoint,events,started) in racers.items():
+                task.cancel()
+                if winner is not None:
+                    # The loser's first token is at least this late.
+                    endpoint.latency.record(time.monotonic()-started)
+            if racers:
+                await asyncio.gather(*racers,return_exceptions=True)
+                for _,events,_ in racers.values():
+                    await events.aclose()
+
+        if winner is None:
+            raised = next((f for f in failures if f[0] is primary),failures[-1])
+            failures.remove(raised)
+        for endpoint,error in failures:
+            self._record_outcome(endpoint,error)
+        if winner is None:
+            raise raised[1]
+
+        endpoint, events, first = winner
+        return endpoint, self._prepend(first,events)
+
+    async def _prepend(self,first:StreamEvent|None,events:AsyncGenerator[StreamEvent,None])->AsyncGenerator[StreamEvent,None]:
+        try:
+            if first is not None:
+                yield first
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def _endpoint_stream(self,endpoint:Endpoint,kwargs:dict[str,Any],estimated_prompt_tokens:int|None,admitted:asyncio.Event|None=None)->AsyncGenerator[StreamEvent,None]:
+        limiter = get_rate_limiter(endpoint.key,self.config.rate_limit)
+        reservation = await limiter.acquire(estimated_prompt_tokens) if limiter else None
+        if admitted is not None:
+            admitted.set()
+        started = time.monotonic()
+        first = True
+        settled = False
+        try:
+            async for event in self._stream_response(self.get_client(endpoint),self._request_for(endpoint,kwargs)):
+                if first:
+                    endpoint.latency.record(time.monotonic()-started)
+                    first = False
+                if event.type == StreamEventType.MESSAGE_COMPLETE:
+                    if reservation and event.usage:
+                        limiter.reconcile(reservation,event.usage.total_tokens)
+                    settled = True
+                yield event
+            settled = True
+        except RateLimitError as e:
+            self._block_limiter(limiter,e)
+            raise
+        finally:
+            if reservation and not settled:
+                # A cancelled hedge or a failed attempt; only the stream
+                # that completes is charged.
+                limiter.release(reservation)
+
+    async def _non_stream_endpoint(self,endpoint:Endpoint,kwargs:dict[str,Any],estimated_prompt_tokens:int|None)->StreamEvent:
+        limiter = get_rate_limiter(endpoint.key,self.config.rate_limit)
+        reservation = await limiter.acquire(estimated_prompt_tokens) if limiter else None
+        try:
+            event = await self._non_stream_response(self.get_client(endpoint),self._request_for(endpoint,kwargs))
+        except BaseException as e:
+            if reservation:
+                limiter.release(reservation)
+            if isinstance(e,RateLimitError):
+                self._block_limiter(limiter,e)
+            raise
+        if reservation and event.usage:
+            limiter.reconcile(reservation,event.usage.total_tokens)
+        return event
+
+    def _block_limiter(self,limiter:RateLimiter|None,error:RateLimitError)->None:
+        if limiter:
+            # The provider's window is full; hold back every caller
+            # sharing this endpoint, not just this one.
+            limiter.block_for(self.retry_policy.retry_after(error) or self.config.retry.base_delay)
+
+    def _estimate_prompt_tokens(self,messages:list[dict[str,Any]])->int:
+        return sum(estimate_tokens(str(msg.get("content") or "")) for msg in messages)
+
+    def _skip_replayed(self,event:StreamEvent,replay:str)->tuple[StreamEvent|None,str]:
+        """Drop the part of a retried stream that was already emitted."""
+        if event.type != StreamEventType.TEXT_DELTA:
+            raise StreamDivergedError("Stream was interrupted and the retry produced different output")
+
+        content = event.text_delta.content
+        overlap = min(len(replay),len(content))
+        if content[:overlap] != replay[:overlap]:
+            raise StreamDivergedError("Stream was interrupted and the retry produced different output")
+
+        content = content[overlap:]
+        replay = replay[overlap:]
+        if not content:
+            return None, replay
+        return StreamEvent(type=StreamEventType.TEXT_DELTA,text_delta=TextDelta(content)), replay
+
+    def _error_message(self,error:BaseException)->str:
+        if isinstance(error,RateLimitError):
+            return f"Rate limit exceeded:{error}"
+        if isinstance(error,(APIConnectionError,httpx.TransportError)):
+            return f"Connection error:{error}"
+        if isinstance(error,StreamDivergedError):
+            return str(error)
+        return f"API error:{error}"
 
     async def _stream_response(self,client:AsyncOpenAI,kwargs:dict[str,Any],)->AsyncGenerator[StreamEvent,None]:
         
@@ -100,15 +396,11 @@ class LLMClient:
         finish_reason : str | None = None
         usage : TokenUsage| None = None
         tool_calls : dict[int,dict[str,Any]] = {}
+        completed : set[int] = set()
 
         async for chunk in response:
             if hasattr(chunk,"usage") and chunk.usage:
-                usage = TokenUsage(
-                    prompt_tokens = chunk.usage.prompt_tokens,
-                    completion_tokens = chunk.usage.completion_tokens,
-                    total_tokens = chunk.usage.total_tokens,
-                    cached_tokens = chunk.usage.prompt_tokens_details.cached_tokens,
-                )
+                usage = self._parse_usage(chunk.usage)
             
             if not chunk.choices:
                 continue
@@ -127,49 +419,87 @@ class LLMClient:
                 for tool_call_delta in delta.tool_calls:
                     idx = tool_call_delta.index
                     if idx not in tool_calls:
+                        # A new index means every earlier call has received
+                        # all of its argument chunks.
+                        for event in self._complete_tool_calls(tool_calls,completed,before=idx):
+                            yield event
+
                         tool_calls[idx] = {
                             "id":tool_call_delta.id or "",
                             "name":"",
-                            "arguments":""
+                            "arguments":ToolArgumentsBuffer()
                         }
-                    
-                        if tool_call_delta.function:
-                            if tool_call_delta.function.name:
-                                tool_calls[idx]["name"]=tool_call_delta.function.name
-                                yield StreamEvent(
-                                    type=StreamEventType.TOOL_CALL_COMPLETE,
-                                    tool_call_delta=ToolCallDelta(
-                                        call_id=tool_calls[idx]["id"],
-                                        name = tool_call_delta.function.name,
-                                    )
+
+                    if tool_call_delta.id and not tool_calls[idx]["id"]:
+                        tool_calls[idx]["id"] = tool_call_delta.id
+
+                    if tool_call_delta.function:
+                        if tool_call_delta.function.name:
+                            tool_calls[idx]["name"]=tool_call_delta.function.name
+                            yield StreamEvent(
+                                type=StreamEventType.TOOL_CALL_START,
+                                tool_call_delta=ToolCallDelta(
+                                    call_id=tool_calls[idx]["id"],
+                                    name = tool_call_delta.function.name,
                                 )
+                            )
 
-                            if tool_call_delta.function.arguments:
-                                tool_calls[idx]['arguments']+= tool_call_delta.function.arguments
-                                yield StreamEvent(
-                                    type=StreamEventType.TOOL_CALL_DELTA,
-                                    tool_call_delta=ToolCallDelta(
-                                        call_id=tool_calls[idx]["id"],
-                                        name = tool_call_delta.function.name,
-                                        arguments_delta=tool_call_delta.function.arguments
-                                    )
+                        if tool_call_delta.function.arguments:
+                            arguments:ToolArgumentsBuffer = tool_calls[idx]['arguments']
+                            arguments.feed(tool_call_delta.function.arguments)
+                            yield StreamEvent(
+                                type=StreamEventType.TOOL_CALL_DELTA,
+                                tool_call_delta=ToolCallDelta(
+                                    call_id=tool_calls[idx]["id"],
+                                    name = tool_calls[idx]["name"] or None,
+                                    arguments_delta=tool_call_delta.function.arguments,
+                                    partial_arguments=arguments.partial_fields if arguments.pop_new_fields() else None,
                                 )
+                            )
 
-        for idx, tc in tool_calls.items():
-            yield StreamEvent(
-                type=StreamEventType.TOOL_CALL_COMPLETE,
-                tool_call=ToolCall(
-                    call_id=tc["id"],
-                    name = tc["name"],
-                    arguments=parse_tool_call_arguments(tc["arguments"])
-                )
-            )
+                            if arguments.is_complete:
+                                for event in self._complete_tool_calls(tool_calls,completed,before=idx+1):
+                                    yield event
+
+        for event in self._complete_tool_calls(tool_calls,completed):
+            yield event
         yield StreamEvent(
             type=StreamEventType.MESSAGE_COMPLETE,
             finish_reason=finish_reason,
             usage=usage
         )
 
+    def _complete_tool_calls(self,tool_calls:dict[int,dict[str,Any]],completed:set[int],before:int|None=None)->list[StreamEvent]:
+        events:list[StreamEvent] = []
+        for idx in sorted(tool_calls):
+            if idx in completed or (before is not None and idx>=before):
+                continue
+
+            tc = tool_calls[idx]
+            completed.add(idx)
+            events.append(
+                StreamEvent(
+                    type=StreamEventType.TOOL_CALL_COMPLETE,
+                    tool_call=ToolCall(
+                        call_id=tc["id"],
+                        name = tc["name"],
+                        arguments=tc["arguments"].parse()
+                    )
+                )
+            )
+
+        return events
+
+    def _parse_usage(self,usage:Any)->TokenUsage:
+        # Many OpenAI-compatible providers omit prompt_tokens_details.
+        details = getattr(usage,"prompt_tokens_details",None)
+        return TokenUsage(
+            prompt_tokens = usage.prompt_tokens or 0,
+            completion_tokens = usage.completion_tokens or 0,
+            total_tokens = usage.total_tokens or 0,
+            cached_tokens = (getattr(details,"cached_tokens",None) or 0) if details else 0,
+        )
+
     async def _non_stream_response(self,client:AsyncOpenAI,kwargs:dict[str,Any],)->StreamEvent:
         response = await client.chat.completions.create(**kwargs)
         choice =  response.choices[0]
@@ -188,12 +518,7 @@ class LLMClient:
                 ))
 
         if response.usage:
-            usage = TokenUsage(
-                prompt_tokens = response.usage.prompt_tokens,
-                completion_tokens = response.usage.completion_tokens,
-                total_tokens = response.usage.total_tokens,
-                cached_tokens = response.usage.prompt_tokens_details.cached_tokens,
-            )
+            usage = self._parse_usage(response.usage)
         
         return StreamEvent(
             type = StreamEventType.MESSAGE_COMPLETE,
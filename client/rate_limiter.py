@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+import threading
+import time
+from config.config import RateLimitConfig
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        missing = min(amount, self.capacity) - self._level
+        return max(0.0, missing / self.refill_rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._level -= amount
+
+    def give(self, amount: float) -> None:
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+
+@dataclass
+class Reservation:
+    tokens: int
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget for one endpoint.
+
+    Callers wait in arrival order until both budgets allow their request.
+    Token reservations use an estimate of the prompt and are corrected
+    once the response reports its actual usage, so a request can leave
+    the bucket in debt that later callers wait out.
+    """
+
+    def __init__(self, requests_per_minute: int | None, tokens_per_minute: int | None):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, estimated_tokens: int) -> Reservation:
+        # Holding the lock while sleeping is what makes the queue fair: the
+        # next caller only starts waiting once this one has been admitted.
+        async with self._lock:
+            while True:
+                wait = max(0.0, self._blocked_until - time.monotonic())
+                if self._requests:
+                    wait = max(wait, self._requests.wait_time(1))
+                if self._tokens:
+                    wait = max(wait, self._tokens.wait_time(estimated_tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(estimated_tokens)
+
+        return Reservation(tokens=estimated_tokens)
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int) -> None:
+        if self._tokens is None:
+            return
+        difference = actual_tokens - reservation.tokens
+        if difference > 0:
+            self._tokens.take(difference)
+        elif difference < 0:
+            self._tokens.give(-difference)
+        reservation.tokens = actual_tokens
+
+    def release(self, reservation: Reservation) -> None:
+        """Return the tokens of a request that was cancelled or failed.
+
+        The request itself still counts against the requests-per-minute
+        budget; its retry reserves tokens again.
+        """
+        if self._tokens is not None and reservation.tokens:
+            self._tokens.give(reservation.tokens)
+        reservation.tokens = 0
+
+    def block_for(self, seconds: float) -> None:
+        """Hold every caller back, e.g. after the provider returned 429."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(endpoint: str, config: RateLimitConfig) -> RateLimiter | None:
+    """Limiter shared by every session and subagent using the endpoint."""
+    if not config.requests_per_minute and not config.tokens_per_minute:
+        return None
+
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = RateLimiter(config.requests_per_minute, config.tokens_per_minute)
+            _limiters[endpoint] = limiter
+        return limiter
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from enum import Enum;
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import json
 from typing import Any
 
@@ -27,6 +27,12 @@ class TokenUsage:
             cached_tokens=self.cached_tokens+other.cached_tokens
             ) 
 
+    @property
+    def cache_hit_ratio(self)->float:
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens/self.prompt_tokens
+
 
 
 
@@ -43,6 +49,7 @@ class ToolCallDelta:
     call_id:str
     name:str|None=None 
     arguments_delta:str = ""
+    partial_arguments:dict[str,Any]|None = None
 
 @dataclass
 class ToolCall:
@@ -60,6 +67,23 @@ class StreamEvent:
     tool_call:ToolCall | None  = None
     usage:TokenUsage | None = None
 
+    def to_dict(self)->dict[str,Any]:
+        data = {key:value for key,value in asdict(self).items() if value is not None}
+        data["type"] = self.type.value
+        return data
+
+    @classmethod
+    def from_dict(cls,data:dict[str,Any])->StreamEvent:
+        return cls(
+            type=StreamEventType(data["type"]),
+            text_delta=TextDelta(**data["text_delta"]) if "text_delta" in data else None,
+            error=data.get("error"),
+            finish_reason=data.get("finish_reason"),
+            tool_call_delta=ToolCallDelta(**data["tool_call_delta"]) if "tool_call_delta" in data else None,
+            tool_call=ToolCall(**data["tool_call"]) if "tool_call" in data else None,
+            usage=TokenUsage(**data["usage"]) if "usage" in data else None,
+        )
+
 @dataclass
 class ToolResultMessage:
     tool_call_id:str
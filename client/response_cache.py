@@ -0,0 +1,173 @@
+from __future__ import annotations
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any
+from client.response import StreamEvent
+from config.config import ResponseCacheConfig, ResponseCacheMode
+from config.loader import get_data_dir
+
+logger = logging.getLogger(__name__)
+
+# (seconds since the previous event, event)
+Recording = list[tuple[float, StreamEvent]]
+
+
+def request_key(request: dict[str, Any], temperature: float) -> str:
+    """Hash of everything that determines the model's answer."""
+    canonical = json.dumps(
+        {"request": request, "temperature": temperature},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completed LLM responses on disk, one JSON file per request key.
+
+    Each file holds the stream events together with the delay before each
+    one, so a response can be replayed chunk for chunk. With max_entries
+    set, the least recently used files are removed once there are more;
+    cassettes are written without a limit.
+    """
+
+    def __init__(self, path: Path, max_entries: int | None = None):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> recording sequence number, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._next_sequence = 0
+        self._replayed: set[str] = set()
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Recording | None:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            self._replayed.add(key)
+
+        data = self._read(key)
+        if data is None:
+            return None
+        try:
+            # Keeps recency across processes.
+            os.utime(self._file(key))
+        except OSError:
+            pass
+        return [(delay, StreamEvent.from_dict(event)) for delay, event in data["events"]]
+
+    def next_unplayed(self) -> Recording | None:
+        """The earliest recording not replayed yet in this process."""
+        with self._lock:
+            pending = [key for key in self._entries if key not in self._replayed]
+            if not pending:
+                return None
+            key = min(pending, key=self._entries.__getitem__)
+        return self.get(key)
+
+    def put(self, key: str, recording: Recording) -> None:
+        with self._lock:
+            sequence = self._entries.get(key, self._next_sequence)
+            self._next_sequence = max(self._next_sequence, sequence + 1)
+            self._entries[key] = sequence
+            self._entries.move_to_end(key)
+
+        data = {
+            "sequence": sequence,
+            "events": [[round(delay, 4), event.to_dict()] for delay, event in recording],
+        }
+        tmp_path = self._file(key).with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp, ensure_ascii=False)
+            os.replace(tmp_path, self._file(key))
+        except OSError as e:
+            logger.warning("Failed to write LLM response cache entry %s: %s", key, e)
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries is None:
+            return
+        while True:
+            with self._lock:
+                if len(self._entries) <= self.max_entries:
+                    return
+                key, _ = self._entries.popitem(last=False)
+            try:
+                self._file(key).unlink()
+            except OSError:
+                pass
+
+    def _load_index(self) -> None:
+        entries: list[tuple[float, str, int]] = []
+        for file_path in self.path.glob("*.json"):
+            data = self._read(file_path.stem)
+            if data is None:
+                continue
+            try:
+                mtime = file_path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, file_path.stem, data.get("sequence", 0)))
+
+        for _, key, sequence in sorted(entries):
+            self._entries[key] = sequence
+            self._next_sequence = max(self._next_sequence, sequence + 1)
+
+    def _read(self, key: str) -> dict[str, Any] | None:
+        try:
+            with open(self._file(key), "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.json"
+
+
+class RecordingStream:
+    """Collects a live stream's events with their timing for the cache."""
+
+    def __init__(self):
+        self.events: Recording = []
+        self._last = time.monotonic()
+
+    def add(self, event: StreamEvent) -> None:
+        now = time.monotonic()
+        self.events.append((now - self._last, event))
+        self._last = now
+
+
+_caches: dict[Path, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(config: ResponseCacheConfig) -> ResponseCache | None:
+    """Cache shared by every client using the same directory."""
+    if config.mode == ResponseCacheMode.OFF:
+        return None
+
+    path = (config.path or get_data_dir() / "llm_cache").expanduser().resolve()
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            max_entries = config.max_entries if config.mode == ResponseCacheMode.CACHE else None
+            cache = ResponseCache(path, max_entries)
+            _caches[path] = cache
+        return cache
@@ -0,0 +1,170 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+import httpx
+from openai import APIConnectionError, APIStatusError
+from config.config import RetryConfig
+
+
+class StreamDivergedError(Exception):
+    """A retried stream did not reproduce the output already emitted."""
+
+
+class RetryPolicy:
+    RETRYABLE_STATUS = {408, 409, 429}
+
+    def __init__(self, config: RetryConfig):
+        self.config = config
+
+    @property
+    def max_retries(self) -> int:
+        return self.config.max_retries
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, (APIConnectionError, httpx.TransportError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code in self.RETRYABLE_STATUS or error.status_code >= 500
+        return False
+
+    def next_delay(self, previous: float | None, error: BaseException) -> float:
+        # Decorrelated jitter: each wait is drawn between the base delay and
+        # three times the previous one, so concurrent sessions spread out
+        # instead of retrying in lockstep.
+        base = self.config.base_delay
+        upper = max(base, (previous or base) * 3)
+        delay = min(self.config.max_delay, random.uniform(base, upper))
+
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.config.max_retry_after))
+
+        return delay
+
+    @staticmethod
+    def retry_after(error: BaseException) -> float | None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return max(0.0, float(value) / 1000)
+            except ValueError:
+                pass
+
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Stops requests to an endpoint after repeated failures.
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests are refused for reset_timeout seconds. Then a single probe
+    request is let through: success closes the circuit, failure opens it
+    again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    @property
+    def failures(self) -> int:
+        """Consecutive failures since the last success."""
+        with self._lock:
+            return self._failures
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probe_started is None:
+                self._probe_started = time.monotonic()
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            self._refresh()
+            if self._state == self.OPEN:
+                return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+            return 0.0 if self._probe_started is None else 1.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_started = None
+        elif (
+            self._state == self.HALF_OPEN
+            and self._probe_started is not None
+            and now - self._probe_started >= self.reset_timeout
+        ):
+            # The probe was abandoned (e.g. cancelled); allow another.
+            self._probe_started = None
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint: str, config: RetryConfig) -> CircuitBreaker:
+    """Breaker shared by every session talking to the same endpoint."""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=config.circuit_failure_threshold,
+                reset_timeout=config.circuit_reset_timeout,
+            )
+            _breakers[endpoint] = breaker
+        return breaker
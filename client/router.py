@@ -0,0 +1,111 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+import math
+import threading
+from config.config import Config, EndpointConfig
+from client.retry import CircuitBreaker, get_circuit_breaker
+
+
+class LatencyStats:
+    """Recent time-to-first-token samples for one endpoint, in seconds."""
+
+    def __init__(self, max_samples: int = 100):
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+        return ordered[index]
+
+
+_stats: dict[str, LatencyStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_latency_stats(endpoint: str) -> LatencyStats:
+    """Latency samples shared by every session talking to the same endpoint."""
+    with _stats_lock:
+        stats = _stats.get(endpoint)
+        if stats is None:
+            stats = LatencyStats()
+            _stats[endpoint] = stats
+        return stats
+
+
+@dataclass
+class Endpoint:
+    name: str
+    base_url: str | None
+    api_key: str | None
+    model: str | None
+    breaker: CircuitBreaker
+    latency: LatencyStats
+
+    @property
+    def key(self) -> str:
+        return self.base_url or self.name
+
+
+class EndpointRouter:
+    """Orders the configured endpoints by health and observed latency.
+
+    Endpoints whose circuit is open are skipped. The rest are tried
+    healthy ones first (closed circuit, no failures since the last
+    success), then by median
+    time-to-first-token. Endpoints without samples sort first, in their
+    configured order, so each one gets measured.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        endpoint_configs = config.endpoints or [
+            EndpointConfig(name="default", base_url=config.base_url or "")
+        ]
+        self.endpoints: list[Endpoint] = []
+        for endpoint_config in endpoint_configs:
+            base_url = endpoint_config.base_url or None
+            # Without explicit endpoints the key stays BASE_URL/API_KEY.
+            api_key = endpoint_config.api_key if config.endpoints else config.api_key
+            key = base_url or endpoint_config.name
+            self.endpoints.append(
+                Endpoint(
+                    name=endpoint_config.name,
+                    base_url=base_url,
+                    api_key=api_key,
+                    model=endpoint_config.model,
+                    breaker=get_circuit_breaker(key, config.retry),
+                    latency=get_latency_stats(key),
+                )
+            )
+
+    def candidates(self, failed: set[str] | None = None) -> list[Endpoint]:
+        """Usable endpoints, best first; keys in failed are tried last."""
+        failed = failed or set()
+        usable = [e for e in self.endpoints if e.breaker.state != CircuitBreaker.OPEN]
+        return sorted(usable, key=lambda e: (e.key in failed, *self._rank(e)))
+
+    def retry_in(self) -> float:
+        return min(e.breaker.retry_in() for e in self.endpoints)
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        routing = self.config.routing
+        if len(endpoint.latency) < routing.min_latency_samples:
+            return routing.hedge_delay
+        return max(routing.min_hedge_delay, endpoint.latency.percentile(0.95) or 0.0)
+
+    def _rank(self, endpoint: Endpoint) -> tuple[bool, float]:
+        median = endpoint.latency.percentile(0.5)
+        healthy = endpoint.breaker.state == CircuitBreaker.CLOSED and not endpoint.breaker.failures
+        return (not healthy, median or 0.0)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+import importlib.util
+import logging
+import httpx
+from config.config import HttpConfig
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per distinct transport configuration, shared by every
+# LLMClient in the process (main agent, subagents and the compactor).
+_clients: dict[tuple, httpx.AsyncClient] = {}
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_client(config: HttpConfig) -> httpx.AsyncClient:
+    key = tuple(sorted(config.model_dump().items()))
+    client = _clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+
+    http2 = config.http2 and http2_available()
+    if config.http2 and not http2:
+        logger.debug("h2 is not installed, falling back to HTTP/1.1")
+
+    client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=config.connect_timeout,
+            read=config.read_timeout,
+            write=config.write_timeout,
+            pool=config.pool_timeout,
+        ),
+        follow_redirects=True,
+    )
+    _clients[key] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -9,6 +9,102 @@ class ModelConfig(BaseModel):
     name:str = "mistralai/devstral-2512:free"
     temperature:float = Field(default=1,ge=0.0,le=2.0)
     context_window:int = 256_000
+    reserved_output_tokens:int = Field(default=8_192,ge=0,description="Tokens kept free in the context window for the model's response")
+
+class ModelPurpose(str, Enum):
+    MAIN = "main"
+    COMPACTION = "compaction"
+    SUBAGENT = "subagent"
+    FAST = "fast"
+
+class ModelTiersConfig(BaseModel):
+    compaction:str|None = Field(None,description="Model used to summarize history; defaults to the main model")
+    subagent:str|None = Field(None,description="Model used by subagents such as codebase_investigator; defaults to the main model")
+    fast:str|None = Field(None,description="Faster model for acknowledgements such as \"thanks\" when route_short_turns is set")
+    route_short_turns:bool = Field(False,description="Answer user messages that only acknowledge the last reply with the fast model")
+    short_turn_max_chars:int = Field(default=200,ge=1,description="Longest user message still treated as an acknowledgement")
+
+class CompactionConfig(BaseModel):
+    background:bool = Field(True,description="Summarize older history in the background once the soft threshold is crossed")
+    local_first:bool = Field(True,description="Drop redundant tool output locally before asking the model for a summary")
+    soft_threshold:float = Field(default=0.6,gt=0.0,le=1.0)
+    hard_threshold:float = Field(default=0.8,gt=0.0,le=1.0)
+    compact_fraction:float = Field(default=0.5,gt=0.0,le=1.0,description="Share of the history (oldest first) summarized by each compaction")
+    keep_recent_steps:int = Field(default=4,ge=0,description="Most recent user/assistant steps that are always kept verbatim")
+    max_summary_chain:int = Field(default=3,ge=1,description="Summaries kept before they are merged into one")
+
+class HttpConfig(BaseModel):
+    max_connections:int = Field(default=100,ge=1)
+    max_keepalive_connections:int = Field(default=20,ge=0)
+    keepalive_expiry:float = Field(default=120.0,ge=0.0,description="Seconds an idle connection is kept open for reuse")
+    http2:bool = Field(True,description="Use HTTP/2 when the h2 package is installed")
+    connect_timeout:float = Field(default=10.0,gt=0.0)
+    read_timeout:float = Field(default=600.0,gt=0.0)
+    write_timeout:float = Field(default=30.0,gt=0.0)
+    pool_timeout:float = Field(default=30.0,gt=0.0)
+
+class RetryConfig(BaseModel):
+    max_retries:int = Field(default=3,ge=0)
+    base_delay:float = Field(default=0.5,gt=0.0,description="Shortest wait between attempts, in seconds")
+    max_delay:float = Field(default=30.0,gt=0.0,description="Longest jittered wait between attempts, in seconds")
+    max_retry_after:float = Field(default=60.0,ge=0.0,description="Cap on waits requested by Retry-After headers, in seconds")
+    circuit_failure_threshold:int = Field(default=5,ge=1,description="Consecutive failures that open the circuit for an endpoint")
+    circuit_reset_timeout:float = Field(default=30.0,gt=0.0,description="Seconds an open circuit refuses requests before probing again")
+
+class RateLimitConfig(BaseModel):
+    requests_per_minute:int|None = Field(default=None,ge=1,description="Requests per minute allowed by the provider for this API key")
+    tokens_per_minute:int|None = Field(default=None,ge=1,description="Tokens per minute allowed by the provider for this API key")
+
+class EndpointConfig(BaseModel):
+    name:str
+    base_url:str
+    api_key_env:str = Field(default="API_KEY",description="Environment variable holding the API key for this endpoint")
+    model:str|None = Field(default=None,description="Model served by this endpoint; defaults to model.name")
+
+    @property
+    def api_key(self)->str|None:
+        return os.environ.get(self.api_key_env)
+
+class RoutingConfig(BaseModel):
+    hedge:bool = Field(False,description="Send a duplicate request to a second endpoint when the first token is late")
+    hedge_delay:float = Field(default=2.0,gt=0.0,description="Hedge delay in seconds used until enough latency samples exist")
+    min_hedge_delay:float = Field(default=0.25,ge=0.0,description="Lower bound for the p95-based hedge delay, in seconds")
+    min_latency_samples:int = Field(default=10,ge=1,description="Samples needed before the observed p95 time-to-first-token is used")
+
+class ResponseCacheMode(str, Enum):
+    OFF = "off"
+    CACHE = "cache"
+    RECORD = "record"
+    REPLAY = "replay"
+
+class ResponseCacheConfig(BaseModel):
+    mode:ResponseCacheMode = Field(ResponseCacheMode.OFF,description="cache: serve repeats from disk; record/replay: write or play back a cassette")
+    path:Path|None = Field(None,description="Directory holding the cache or cassette; defaults to llm_cache in the data dir")
+    max_entries:int = Field(default=1000,ge=1,description="Responses kept in cache mode before the least recently used are evicted")
+    replay_timing:bool = Field(False,description="Replay cached streams with their original chunk timing instead of instantly")
+    replay_strict:bool = Field(True,description="In replay mode, fail on unrecorded requests instead of playing the next recording in order")
+
+class IgnoreConfig(BaseModel):
+    respect_gitignore:bool = Field(True,description="Skip files matched by .gitignore, .ignore and .git/info/exclude when walking the workspace")
+    exclude:list[str] = Field(
+        default_factory=lambda:[".git/","node_modules/","__pycache__/",".venv/","venv/"],
+        description="Gitignore-style patterns skipped in every workspace",
+    )
+
+class FileIndexConfig(BaseModel):
+    enabled:bool = Field(True,description="Serve grep, glob and list_dir from an in-memory index of the workspace")
+    persist:bool = Field(False,description="Save the index in the data dir so new sessions start warm")
+    refresh_interval:float = Field(default=2.0,ge=0.0,description="Minimum seconds between full mtime rescans of the workspace")
+
+class GrepConfig(BaseModel):
+    workers:int = Field(default_factory=lambda:min(8,os.cpu_count() or 1),ge=1,description="Worker threads or processes searching files in parallel")
+    use_processes:bool = Field(False,description="Search in worker processes so large scans use every core")
+    max_matches:int = Field(default=1000,ge=1,description="Stop searching once this many matching lines were found")
+
+class TrigramIndexConfig(BaseModel):
+    enabled:bool = Field(False,description="Narrow grep to candidate files with a trigram index kept in the data dir")
+    max_file_bytes:int = Field(default=1_000_000,ge=0,description="Larger files are not indexed and are always searched")
+    rebuild_threshold:float = Field(default=0.2,ge=0.0,le=1.0,description="Rebuild the index in the background once this fraction of searched files changed since it was built")
 
 class ShellEnvironmentPolicy(BaseModel):
     ignore_default_excludes:bool = False
@@ -83,9 +179,26 @@ class MCPServerConfig(BaseModel):
 
 class Config(BaseModel):
     model : ModelConfig =  Field(default_factory=ModelConfig)
+    models : ModelTiersConfig = Field(default_factory=ModelTiersConfig)
     cwd:Path = Field(default_factory=Path.cwd)
     shell_environment:ShellEnvironmentPolicy = Field(default_factory=ShellEnvironmentPolicy)
     max_turns:int = 100
+    compaction:CompactionConfig = Field(default_factory=CompactionConfig)
+    http:HttpConfig = Field(default_factory=HttpConfig)
+    retry:RetryConfig = Field(default_factory=RetryConfig)
+    rate_limit:RateLimitConfig = Field(default_factory=RateLimitConfig)
+    endpoints:list[EndpointConfig] = Field(default_factory=list,description="LLM endpoints to route between; defaults to BASE_URL/API_KEY")
+    routing:RoutingConfig = Field(default_factory=RoutingConfig)
+    response_cache:ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
+    parallel_tool_calls:bool = True
+    max_parallel_tool_calls:int = Field(default=8,ge=1,description="Maximum number of read-only tool calls executed concurrently")
+    early_tool_dispatch:bool = Field(True,description="Start read-only tool calls while the model is still streaming the rest of its turn")
+    stable_prompt_prefix:bool = Field(True,description="Keep the system prompt and tool schemas byte-stable so providers can cache the prompt prefix")
+    ignore:IgnoreConfig = Field(default_factory=IgnoreConfig)
+    file_index:FileIndexConfig = Field(default_factory=FileIndexConfig)
+    grep:GrepConfig = Field(default_factory=GrepConfig)
+    trigram_index:TrigramIndexConfig = Field(default_factory=TrigramIndexConfig)
+    dedupe_file_reads:bool = Field(True,description="Replace re-reads of unchanged files with a reference to the earlier result")
     mcp_servers: dict[str, MCPServerConfig] = Field(default_factory=dict)
     allowed_tools:list[str] | None = Field(None,description="If set, only these tools will be available to the agent")
     developer_instructions:str|None = None
@@ -111,6 +224,12 @@ class Config(BaseModel):
     def model_name(self,value:str)->None:
         self.model.name = value
 
+    def model_tier(self,purpose:ModelPurpose)->str|None:
+        """Model configured for purpose, or None to use the main model."""
+        if purpose == ModelPurpose.MAIN:
+            return None
+        return getattr(self.models,purpose.value)
+
     @property
     def temperature(self)->str:
         return self.model.temperature
@@ -121,7 +240,14 @@ class Config(BaseModel):
 
     def validate(self)->list[str]:
         errors:list[str]=[]
-        if not self.api_key:
+        # Replay never reaches a provider, so no key is needed.
+        if self.response_cache.mode == ResponseCacheMode.REPLAY:
+            pass
+        elif self.endpoints:
+            for endpoint in self.endpoints:
+                if not endpoint.api_key:
+                    errors.append(f"No API key found for endpoint '{endpoint.name}'. Set {endpoint.api_key_env} environment variable")
+        elif not self.api_key:
             errors.append("No API key found. Set API_KEY environment variable")
         if not self.cwd.exists():
             errors.append(f"Working directory does not exists: {self.cwd}")
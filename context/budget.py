@@ -0,0 +1,159 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from enum import Enum
+import logging
+from typing import Any
+from config.config import Config
+from context.manager import ContextManager
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetAction(str, Enum):
+    TRUNCATE = "truncate"
+    ELIDE = "elide"
+
+
+@dataclass
+class BudgetDecision:
+    index: int
+    action: BudgetAction
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+@dataclass
+class BudgetPlan:
+    budget: int
+    estimated_tokens: int
+    decisions: list[BudgetDecision] = field(default_factory=list)
+    needs_summary: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(decision.tokens_saved for decision in self.decisions)
+
+    @property
+    def planned_tokens(self) -> int:
+        return self.estimated_tokens - self.tokens_saved
+
+
+@dataclass
+class BudgetMetrics:
+    plans: int = 0
+    over_budget_plans: int = 0
+    truncated: int = 0
+    elided: int = 0
+    tokens_saved: int = 0
+    summaries_requested: int = 0
+
+    def record(self, plan: BudgetPlan) -> None:
+        self.plans += 1
+        if plan.estimated_tokens > plan.budget:
+            self.over_budget_plans += 1
+        for decision in plan.decisions:
+            if decision.action == BudgetAction.TRUNCATE:
+                self.truncated += 1
+            else:
+                self.elided += 1
+        self.tokens_saved += plan.tokens_saved
+        if plan.needs_summary:
+            self.summaries_requested += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class ContextBudgetPlanner:
+    # Tool outputs are first cut down to this size before being elided.
+    TRUNCATE_TARGET_TOKENS = 2_000
+    ELIDED_TOKENS = 16
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.metrics = BudgetMetrics()
+
+    @property
+    def budget(self) -> int:
+        model = self.config.model
+        return max(0, model.context_window - model.reserved_output_tokens)
+
+    def plan(self, context_manager: ContextManager) -> BudgetPlan:
+        plan = BudgetPlan(
+            budget=self.budget,
+            estimated_tokens=context_manager.estimated_tokens,
+        )
+        over = plan.estimated_tokens - plan.budget
+
+        if over > 0:
+            candidates = self._candidates(context_manager)
+            decisions: dict[int, BudgetDecision] = {}
+
+            for index, tokens in candidates:
+                if over <= 0:
+                    break
+                if tokens <= self.TRUNCATE_TARGET_TOKENS:
+                    continue
+                decisions[index] = BudgetDecision(
+                    index, BudgetAction.TRUNCATE, tokens, self.TRUNCATE_TARGET_TOKENS
+                )
+                over -= tokens - self.TRUNCATE_TARGET_TOKENS
+
+            for index, tokens in candidates:
+                if over <= 0:
+                    break
+                if tokens <= self.ELIDED_TOKENS:
+                    continue
+                previous = decisions.get(index)
+                remaining = previous.tokens_after if previous else tokens
+                decisions[index] = BudgetDecision(
+                    index, BudgetAction.ELIDE, tokens, self.ELIDED_TOKENS
+                )
+                over -= remaining - self.ELIDED_TOKENS
+
+            plan.decisions = sorted(decisions.values(), key=lambda d: d.index)
+            plan.needs_summary = over > 0
+
+        self.metrics.record(plan)
+        if plan.decisions or plan.needs_summary:
+            logger.info(
+                "Context budget plan: %d/%d tokens, %d truncated, %d elided, %d saved, summary=%s",
+                plan.estimated_tokens,
+                plan.budget,
+                sum(1 for d in plan.decisions if d.action == BudgetAction.TRUNCATE),
+                sum(1 for d in plan.decisions if d.action == BudgetAction.ELIDE),
+                plan.tokens_saved,
+                plan.needs_summary,
+            )
+
+        return plan
+
+    def apply(self, plan: BudgetPlan, context_manager: ContextManager) -> None:
+        for decision in plan.decisions:
+            if decision.action == BudgetAction.TRUNCATE:
+                context_manager.truncate_tool_output(decision.index, decision.tokens_after)
+            else:
+                context_manager.elide_tool_output(decision.index)
+
+    def _candidates(self, context_manager: ContextManager) -> list[tuple[int, int]]:
+        messages = context_manager.messages
+
+        # Results of the most recent tool turn are what the model is working
+        # on right now, so they are never touched.
+        protected_from = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index].role == "assistant" and messages[index].tool_calls:
+                protected_from = index
+                break
+
+        # Reads that a later back-reference points to must stay verbatim.
+        pinned = context_manager.back_referenced_calls()
+        return [
+            (index, msg.token_count or 0)
+            for index, msg in enumerate(messages[:protected_from])
+            if msg.role == "tool" and not msg.pruned_at and msg.tool_call_id not in pinned
+        ]
@@ -1,13 +1,118 @@
+import asyncio
+from dataclasses import dataclass
+import logging
 from typing import Any
 from client.llm_client import LLMClient
 from client.response import StreamEventType, TokenUsage
+from config.config import ModelPurpose
+from context.local_compaction import LocalCompactor
 from context.manager import ContextManager
 from prompts.system import get_compression_prompt
 
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompactionResult:
+    summary: str
+    usage: TokenUsage
+    upto: int
+    history_version: int
+
+
 class ChatCompactor:
     def __init__(self, client: LLMClient):
         self.client = client
+        self.local_compactor = LocalCompactor()
+        self._background: asyncio.Task[tuple[str | None, TokenUsage | None]] | None = None
+        self._background_upto = 0
+        self._background_version = 0
+
+    @property
+    def background_running(self) -> bool:
+        return self._background is not None and not self._background.done()
+
+    def compact_locally(self, context_manager: ContextManager, threshold: float) -> bool:
+        if not context_manager.config.compaction.local_first:
+            return False
+
+        stats = self.local_compactor.compact(context_manager)
+        if stats.actions:
+            logger.info(
+                "Local compaction saved %d tokens (%d reads deduplicated, %d stale reads, "
+                "%d edits collapsed, %d shell outputs trimmed)",
+                stats.tokens_saved,
+                stats.reads_deduplicated,
+                stats.stale_reads_dropped,
+                stats.edits_collapsed,
+                stats.shell_outputs_trimmed,
+            )
+
+        return not context_manager.needs_compression(threshold)
+
+    def start_background(self, context_manager: ContextManager) -> bool:
+        if self._background is not None:
+            return False
+
+        upto = context_manager.compaction_boundary()
+        # Serialized messages are replaced, never mutated, so this slice is
+        # a stable snapshot even while the agent keeps working.
+        messages = context_manager.messages_for_compaction(upto)
+        if len(messages) < 2:
+            return False
+
+        self._background_upto = upto
+        self._background_version = context_manager.history_version
+        self._background = asyncio.create_task(
+            self._summarize(messages, self._previous_summary(context_manager))
+        )
+        return True
+
+    def take_background_result(
+        self, context_manager: ContextManager
+    ) -> CompactionResult | None:
+        if self._background is None or not self._background.done():
+            return None
+
+        task = self._background
+        self._background = None
+        if task.cancelled():
+            return None
+
+        try:
+            summary, usage = task.result()
+        except Exception:
+            logger.exception("Background compaction failed")
+            return None
+
+        if not summary or not usage:
+            return None
+
+        if self._background_version != context_manager.history_version:
+            # The history was rewritten after the snapshot was taken.
+            return None
+
+        return CompactionResult(
+            summary=summary,
+            usage=usage,
+            upto=self._background_upto,
+            history_version=self._background_version,
+        )
+
+    async def wait_background(
+        self, context_manager: ContextManager
+    ) -> CompactionResult | None:
+        if self._background is None:
+            return None
+
+        await asyncio.wait({self._background})
+        return self.take_background_result(context_manager)
+
+    def cancel_background(self) -> None:
+        if self._background is not None:
+            self._background.cancel()
+            self._background = None
 
     def _format_history_for_compaction(self, messages: list[dict[str, Any]]) -> str:
         output = ["Here is the conversation that needs to be continue: \n"]
@@ -55,13 +160,71 @@ class ChatCompactor:
         return "\n\n---\n\n".join(output)
 
     async def compress(
-        self, context_manager: ContextManager
+        self, context_manager: ContextManager, fraction: float | None = None
+    ) -> CompactionResult | None:
+        if self.compact_locally(
+            context_manager, context_manager.config.compaction.soft_threshold
+        ):
+            return None
+
+        upto = context_manager.compaction_boundary(fraction=fraction)
+        messages = context_manager.messages_for_compaction(upto)
+
+        if len(messages) < 2:
+            return None
+
+        summary, usage = await self._summarize(
+            messages, self._previous_summary(context_manager)
+        )
+        if not summary or not usage:
+            return None
+
+        return CompactionResult(
+            summary=summary,
+            usage=usage,
+            upto=upto,
+            history_version=context_manager.history_version,
+        )
+
+    async def merge_summaries(self, context_manager: ContextManager) -> TokenUsage | None:
+        summaries = context_manager.summaries
+        if len(summaries) < 2:
+            return None
+
+        history = "\n\n---\n\n".join(
+            f"Summary {number} (oldest first):\n{text}"
+            for number, text in enumerate(summaries, start=1)
+        )
+        summary, usage = await self._request_summary(
+            "Here are consecutive summaries of one conversation that need to be "
+            "merged into a single summary:\n\n" + history
+        )
+        if not summary or not usage:
+            return None
+
+        context_manager.replace_summary_chain([summary])
+        return usage
+
+    def _previous_summary(self, context_manager: ContextManager) -> str | None:
+        summaries = context_manager.summaries
+        return summaries[-1] if summaries else None
+
+    async def _summarize(
+        self, messages: list[dict[str, Any]], previous_summary: str | None = None
     ) -> tuple[str | None, TokenUsage | None]:
-        messages = context_manager.get_messages()
+        history = self._format_history_for_compaction(messages)
+        if previous_summary:
+            history = (
+                "Summary of the work before this part of the conversation "
+                "(already recorded, summarize only what follows):\n"
+                f"{previous_summary[:4000]}\n\n---\n\n{history}"
+            )
 
-        if len(messages) < 3:
-            return None, None
+        return await self._request_summary(history)
 
+    async def _request_summary(
+        self, content: str
+    ) -> tuple[str | None, TokenUsage | None]:
         compression_messages = [
             {
                 "role": "system",
@@ -69,7 +232,7 @@ class ChatCompactor:
             },
             {
                 "role": "user",
-                "content": self._format_history_for_compaction(messages),
+                "content": content,
             },
         ]
 
@@ -79,6 +242,7 @@ class ChatCompactor:
             async for event in self.client.chat_completion(
                 compression_messages,
                 stream=False,
+                purpose=ModelPurpose.COMPACTION,
             ):
                 if event.type == StreamEventType.MESSAGE_COMPLETE:
                     usage = event.usage
@@ -89,4 +253,4 @@ class ChatCompactor:
 
             return summary, usage
         except Exception:
-            return None, None
\ No newline at end of file
+            return None, None
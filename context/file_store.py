@@ -0,0 +1,51 @@
+from __future__ import annotations
+from dataclasses import dataclass
+
+BACK_REFERENCE_PREFIX = "[Unchanged since tool call "
+
+
+@dataclass(frozen=True)
+class FileReadKey:
+    path: str
+    mtime_ns: int
+    content_hash: str
+
+
+class FileReadStore:
+    """Remembers which tool call first returned a given file read.
+
+    Keys combine the path, the file's mtime and a hash of the returned
+    text, so a read only matches when both the file and the requested
+    range are unchanged.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[FileReadKey, str] = {}
+
+    def lookup(self, key: FileReadKey) -> str | None:
+        return self._calls.get(key)
+
+    def record(self, key: FileReadKey, call_id: str) -> None:
+        self._calls[key] = call_id
+
+
+def back_reference(call_id: str, path: str) -> str:
+    return (
+        f"{BACK_REFERENCE_PREFIX}{call_id}] {path} has not changed since it was "
+        f"read in tool call {call_id}; refer to that result."
+    )
+
+
+def is_back_reference(content: str) -> bool:
+    return content.startswith(BACK_REFERENCE_PREFIX)
+
+
+def parse_back_reference(content: str) -> tuple[str, str] | None:
+    """The (call_id, path) a back-reference points to, if content is one."""
+    if not is_back_reference(content):
+        return None
+    call_id, sep, rest = content[len(BACK_REFERENCE_PREFIX):].partition("] ")
+    path, found, _ = rest.partition(" has not changed since")
+    if not sep or not found:
+        return None
+    return call_id, path
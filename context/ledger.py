@@ -0,0 +1,62 @@
+from collections import defaultdict
+from typing import Any
+
+
+class TokenLedger:
+    # Chat formats wrap every message in a few framing tokens.
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self) -> None:
+        self.system_tokens = 0
+        self.tool_schema_tokens = 0
+        self._role_tokens: defaultdict[str, int] = defaultdict(int)
+        self._role_counts: defaultdict[str, int] = defaultdict(int)
+        self._message_tokens = 0
+
+    def set_system_tokens(self, tokens: int) -> None:
+        self.system_tokens = tokens
+
+    def set_tool_schema_tokens(self, tokens: int) -> None:
+        self.tool_schema_tokens = tokens
+
+    def add(self, role: str, tokens: int) -> None:
+        self._role_tokens[role] += tokens
+        self._role_counts[role] += 1
+        self._message_tokens += tokens + self.MESSAGE_OVERHEAD_TOKENS
+
+    def remove(self, role: str, tokens: int) -> None:
+        self._role_tokens[role] -= tokens
+        self._role_counts[role] -= 1
+        self._message_tokens -= tokens + self.MESSAGE_OVERHEAD_TOKENS
+
+    def update(self, role: str, old_tokens: int, new_tokens: int) -> None:
+        self._role_tokens[role] += new_tokens - old_tokens
+        self._message_tokens += new_tokens - old_tokens
+
+    def reset_messages(self) -> None:
+        self._role_tokens.clear()
+        self._role_counts.clear()
+        self._message_tokens = 0
+
+    def role_tokens(self, role: str) -> int:
+        return self._role_tokens.get(role, 0)
+
+    def role_count(self, role: str) -> int:
+        return self._role_counts.get(role, 0)
+
+    @property
+    def message_tokens(self) -> int:
+        return self._message_tokens
+
+    @property
+    def total(self) -> int:
+        return self.system_tokens + self.tool_schema_tokens + self._message_tokens
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "system": self.system_tokens,
+            "tool_schemas": self.tool_schema_tokens,
+            "messages": self._message_tokens,
+            "by_role": dict(self._role_tokens),
+        }
@@ -0,0 +1,180 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import json
+from typing import Any
+from context.file_store import is_back_reference
+from context.manager import ContextManager
+from utils.paths import resolve_path
+
+
+@dataclass
+class LocalCompactionStats:
+    reads_deduplicated: int = 0
+    stale_reads_dropped: int = 0
+    edits_collapsed: int = 0
+    shell_outputs_trimmed: int = 0
+    tokens_saved: int = 0
+
+    @property
+    def actions(self) -> int:
+        return (
+            self.reads_deduplicated
+            + self.stale_reads_dropped
+            + self.edits_collapsed
+            + self.shell_outputs_trimmed
+        )
+
+
+@dataclass
+class _CallInfo:
+    assistant_index: int
+    name: str
+    args: dict[str, Any]
+    arguments_are_json: bool
+
+
+class LocalCompactor:
+    """Shrinks history in place without calling the model.
+
+    Only information that a later message makes redundant is removed:
+    repeated reads of a file, reads of files that were changed afterwards,
+    and the payload of a write_file or edit whose text no longer exists,
+    because a later write_file replaced the whole file or a later edit's
+    old_string covered it. Edits elsewhere in the file are cumulative and
+    are kept. Long shell outputs keep their head and tail.
+    """
+
+    SHELL_KEEP_TOKENS = 1_000
+    WRITE_TOOLS = {"write_file", "edit"}
+
+    def compact(self, context_manager: ContextManager) -> LocalCompactionStats:
+        stats = LocalCompactionStats()
+        tokens_before = context_manager.estimated_tokens
+        messages = context_manager.messages
+        calls = self._collect_calls(context_manager)
+        protected_from = context_manager.compaction_boundary(fraction=1.0)
+        pinned = context_manager.back_referenced_calls()
+
+        later_writes: set[str] = set()
+        # Paths rewritten by a later write_file, and the old_string of
+        # every later edit per path.
+        later_rewrites: set[str] = set()
+        later_replaced: dict[str, list[str]] = {}
+        later_full_reads: set[str] = set()
+        later_reads: set[tuple[str, int, int | None]] = set()
+
+        # Walk newest to oldest so "later" is everything already visited.
+        for index in range(len(messages) - 1, -1, -1):
+            msg = messages[index]
+            if msg.role != "tool" or not msg.tool_call_id:
+                continue
+
+            call = calls.get(msg.tool_call_id)
+            if call is None:
+                continue
+
+            compactable = index < protected_from and not msg.pruned_at
+            path = self._path(context_manager, call.args)
+
+            if call.name == "read_file" and path:
+                if is_back_reference(msg.content):
+                    # Refers to an earlier read, which must stay in place.
+                    continue
+                offset = call.args.get("offset", 1)
+                limit = call.args.get("limit")
+
+                if compactable and msg.tool_call_id not in pinned:
+                    if path in later_writes:
+                        context_manager.elide_tool_output(
+                            index, f"[Content of {path} elided: the file was modified later]"
+                        )
+                        stats.stale_reads_dropped += 1
+                    elif path in later_full_reads or (path, offset, limit) in later_reads:
+                        context_manager.elide_tool_output(
+                            index, f"[Content of {path} elided: the file was read again later]"
+                        )
+                        stats.reads_deduplicated += 1
+
+                later_reads.add((path, offset, limit))
+                if offset == 1 and limit is None:
+                    later_full_reads.add(path)
+
+            elif call.name in self.WRITE_TOOLS and path:
+                if compactable and "note" not in call.args and self._superseded(
+                    call, path, later_rewrites, later_replaced
+                ):
+                    collapsed = {
+                        "path": call.args.get("path"),
+                        "note": "payload elided: superseded by a later change",
+                    }
+                    context_manager.replace_tool_call_arguments(
+                        call.assistant_index,
+                        msg.tool_call_id,
+                        json.dumps(collapsed) if call.arguments_are_json else collapsed,
+                    )
+                    stats.edits_collapsed += 1
+                later_writes.add(path)
+                if call.name == "write_file":
+                    later_rewrites.add(path)
+                elif isinstance(call.args.get("old_string"), str) and call.args["old_string"]:
+                    later_replaced.setdefault(path, []).append(call.args["old_string"])
+
+            elif call.name == "shell" and compactable:
+                if (msg.token_count or 0) > self.SHELL_KEEP_TOKENS * 2:
+                    context_manager.truncate_tool_output(
+                        index,
+                        self.SHELL_KEEP_TOKENS,
+                        suffix="\n... [shell output trimmed during compaction]",
+                    )
+                    stats.shell_outputs_trimmed += 1
+
+        stats.tokens_saved = tokens_before - context_manager.estimated_tokens
+        return stats
+
+    def _superseded(
+        self,
+        call: _CallInfo,
+        path: str,
+        later_rewrites: set[str],
+        later_replaced: dict[str, list[str]],
+    ) -> bool:
+        if path in later_rewrites:
+            return True
+
+        written = call.args.get("new_string" if call.name == "edit" else "content")
+        if not isinstance(written, str) or not written:
+            return False
+        return any(written in old_string for old_string in later_replaced.get(path, []))
+
+    def _collect_calls(self, context_manager: ContextManager) -> dict[str, _CallInfo]:
+        calls: dict[str, _CallInfo] = {}
+        for index, msg in enumerate(context_manager.messages):
+            if msg.role != "assistant":
+                continue
+
+            for tc in msg.tool_calls:
+                function = tc.get("function", {})
+                args = function.get("arguments", {})
+                arguments_are_json = isinstance(args, str)
+                if arguments_are_json:
+                    try:
+                        args = json.loads(args)
+                    except json.JSONDecodeError:
+                        args = {}
+                if not isinstance(args, dict):
+                    args = {}
+
+                calls[tc.get("id", "")] = _CallInfo(
+                    assistant_index=index,
+                    name=function.get("name", ""),
+                    args=args,
+                    arguments_are_json=arguments_are_json,
+                )
+
+        return calls
+
+    def _path(self, context_manager: ContextManager, args: dict[str, Any]) -> str | None:
+        path = args.get("path")
+        if not isinstance(path, str) or not path:
+            return None
+        return str(resolve_path(context_manager.config.cwd, path))
@@ -1,23 +1,30 @@
+import json
 from typing import Any
 from client.response import TokenUsage
+from context.file_store import back_reference, parse_back_reference
+from context.ledger import TokenLedger
 from config.config import Config
-from prompts.system import get_system_prompt
+from prompts.system import get_session_context_prompt, get_system_prompt
 from dataclasses import dataclass, field
 from tools.base import Tool
-from utils.text import count_tokens
+from utils.text import TruncateMode, count_tokens, count_tokens_many, truncate_text
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class MessageItem:
     role:str
     content:str
     tool_call_id:str|None=None
     tool_calls:list[dict[str,Any]] = field(default_factory=list)
-    token_count:str|None=None
+    token_count:int|None=None
     pruned_at: datetime | None = None
+    _serialized:dict[str,Any]|None = field(default=None,init=False,repr=False,compare=False)
 
     def to_dict(self)->dict[str,Any]:
+        if self._serialized is not None:
+            return self._serialized
+
         result:dict[str,Any] = {"role":self.role}
 
         if self.tool_call_id:
@@ -29,8 +36,14 @@ class MessageItem:
         if self.content:
             result["content"] = self.content
 
+        self._serialized = result
         return result
 
+    def set_content(self,content:str,token_count:int|None=None)->None:
+        self.content = content
+        self.token_count = token_count
+        self._serialized = None
+
 class ContextManager:
 
     PRUNE_PROTECT_TOKENS = 40_000
@@ -38,11 +51,38 @@ class ContextManager:
 
     def __init__(self,config:Config,user_memory:str|None,tools:list[Tool]|None)->None:
         self._system_prompt = get_system_prompt(config,user_memory=user_memory,tools=tools)
+        # Computed once per session and placed after the stable system prompt.
+        self._session_context = get_session_context_prompt(config,user_memory=user_memory)
         self.config = config
         self._model_name = self.config.model.name
         self._messages:list[MessageItem] = []
+        # Serialized form of _messages, kept in step so each turn only
+        # serializes the messages added since the previous one.
+        self._message_dicts:list[dict[str,Any]] = []
+        self._tool_results:dict[str,MessageItem] = {}
+        self._system_messages = [
+            {"role":"system","content":content}
+            for content in (self._system_prompt,self._session_context)
+            if content
+        ]
         self._latest_usage = TokenUsage()
         self.total_usage = TokenUsage()
+        self.ledger = TokenLedger()
+        # Bumped whenever the history is rewritten rather than appended to,
+        # so snapshots taken for background work can detect they are stale.
+        self.history_version = 0
+        # Rolling compaction keeps every summary produced so far and the
+        # number of leading messages that restate them.
+        self._summaries:list[str] = []
+        self._preamble_length = 0
+        self.ledger.set_system_tokens(
+            sum(count_tokens_many([msg["content"] for msg in self._system_messages],self._model_name))
+        )
+        self.set_tool_schemas([tool.to_openai_schema() for tool in tools or []])
+
+    def set_tool_schemas(self,schemas:list[dict[str,Any]])->None:
+        tokens = count_tokens(json.dumps(schemas),self._model_name) if schemas else 0
+        self.ledger.set_tool_schema_tokens(tokens)
 
     def add_user_message(self,content:str):
         item = MessageItem(
@@ -51,17 +91,17 @@ class ContextManager:
             token_count=count_tokens(content,self._model_name)
         )
 
-        self._messages.append(item)
+        self._append(item)
 
     def add_assistant_message(self,content:str,tool_calls:list[dict[str,Any]]):
         item = MessageItem(
             role="assistant",
             content = content or "",
-            token_count=count_tokens(content or "",self._model_name),
+            token_count=self._count_message_tokens(content, tool_calls),
             tool_calls=tool_calls or [],
         )
 
-        self._messages.append(item)
+        self._append(item)
 
     def add_tool_result(self,tool_call_id:str,content:str)->None:
         item = MessageItem(
@@ -71,32 +111,72 @@ class ContextManager:
             token_count=count_tokens(content,self._model_name)
         )
 
+        self._append(item)
+
+    def add_tool_results(self,results:list[tuple[str,str]])->None:
+        """Add (tool_call_id, content) pairs, counting their tokens in one batch."""
+        token_counts = count_tokens_many([content for _,content in results],self._model_name)
+        for (tool_call_id,content),token_count in zip(results,token_counts):
+            self._append(
+                MessageItem(
+                    role='tool',
+                    content=content,
+                    tool_call_id=tool_call_id,
+                    token_count=token_count,
+                )
+            )
+
+    def _append(self,item:MessageItem)->None:
         self._messages.append(item)
+        self._message_dicts.append(item.to_dict())
+        self.ledger.add(item.role,item.token_count or 0)
+        if item.role == "tool" and item.tool_call_id:
+            self._tool_results[item.tool_call_id] = item
+
+    @property
+    def messages(self) -> list[MessageItem]:
+        return self._messages
+
+    def has_tool_result(self, tool_call_id: str, content: str) -> bool:
+        """Whether the result of tool_call_id is still in the history verbatim."""
+        item = self._tool_results.get(tool_call_id)
+        return item is not None and item.content == content
+
+    def back_referenced_calls(self) -> set[str]:
+        """Tool calls whose result a later back-reference points to.
+
+        Those results must stay verbatim, so pruning, the budget planner
+        and local compaction leave them alone.
+        """
+        targets = set()
+        for item in self._tool_results.values():
+            reference = parse_back_reference(item.content)
+            if reference:
+                targets.add(reference[0])
+        return targets
 
     @property
     def message_count(self) -> int:
         return len(self._messages)
 
     def get_messages(self)->list[dict[str,Any]]:
-        messages  = []
-        if self._system_prompt:
-            messages.append(
-                {
-                    "role":"system",
-                    "content":self._system_prompt
-                }
-            )
-
-        for item in self._messages:
-            messages.append(item.to_dict())
-
-        return messages
+        return [*self._system_messages,*self._message_dicts]
     
-    def needs_compression(self) -> bool:
+    @property
+    def estimated_tokens(self) -> int:
+        return self.ledger.total
+
+    def needs_compression(self, threshold: float | None = None) -> bool:
         context_limit = self.config.model.context_window
-        current_tokens = self._latest_usage.total_tokens
+        current_tokens = self.ledger.total
+        if threshold is None:
+            threshold = self.config.compaction.hard_threshold
+
+        return current_tokens > (context_limit * threshold)
 
-        return current_tokens > (context_limit * 0.8)
+    @property
+    def latest_usage(self) -> TokenUsage:
+        return self._latest_usage
 
     def set_latest_usage(self, usage: TokenUsage):
         self._latest_usage = usage
@@ -104,8 +184,67 @@ class ContextManager:
     def add_usage(self, usage: TokenUsage):
         self.total_usage += usage
 
-    def replace_with_summary(self, summary: str) -> None:
-        self._messages = []
+    @property
+    def summaries(self) -> list[str]:
+        return list(self._summaries)
+
+    def compaction_boundary(
+        self,
+        keep_recent_steps: int | None = None,
+        fraction: float | None = None,
+    ) -> int:
+        compaction = self.config.compaction
+        if keep_recent_steps is None:
+            keep_recent_steps = compaction.keep_recent_steps
+        if fraction is None:
+            fraction = compaction.compact_fraction
+
+        # A step starts at every user or assistant message; cutting there
+        # never separates tool results from the call that produced them.
+        step_starts = [
+            index
+            for index in range(self._preamble_length, len(self._messages))
+            if self._messages[index].role != "tool"
+        ]
+        if len(step_starts) <= keep_recent_steps:
+            return self._preamble_length
+
+        latest = step_starts[-keep_recent_steps] if keep_recent_steps > 0 else len(self._messages)
+        target = self._preamble_length + int((len(self._messages) - self._preamble_length) * fraction)
+        for index in step_starts:
+            if index >= target:
+                return min(index, latest)
+
+        return latest
+
+    def messages_for_compaction(self, upto: int) -> list[dict[str, Any]]:
+        # Only history since the previous summary; earlier work is already
+        # captured in the summary chain.
+        return self._message_dicts[self._preamble_length:upto]
+
+    def replace_with_summary(self, summary: str, upto: int | None = None) -> None:
+        self._summaries.append(summary)
+        self._rebuild_preamble(upto)
+
+    def replace_summary_chain(self, summaries: list[str]) -> None:
+        self._summaries = list(summaries)
+        self._rebuild_preamble(self._preamble_length)
+
+    def _rebuild_preamble(self, upto: int | None) -> None:
+        tail = self._messages[upto:] if upto is not None else []
+        if upto is not None:
+            self._restore_back_references(self._messages[:upto], tail)
+        summaries = self._summaries
+        self.clear()
+        self._summaries = summaries
+
+        if len(summaries) == 1:
+            summary = summaries[0]
+        else:
+            summary = "\n\n".join(
+                f"## Part {number} (oldest first)\n\n{text}"
+                for number, text in enumerate(summaries, start=1)
+            )
 
         continuation_content = f"""# Context Restoration (Previous Session Compacted)
 
@@ -126,7 +265,13 @@ class ContextManager:
             content=continuation_content,
             token_count=count_tokens(continuation_content, self._model_name),
         )
-        self._messages.append(summary_item)
+        self._append(summary_item)
+
+        if tail and tail[0].role == "assistant":
+            self._preamble_length = len(self._messages)
+            for item in tail:
+                self._append(item)
+            return
 
         ack_content = """I've reviewed the context from the previous session. I understand:
 - The original goal and what was requested
@@ -140,7 +285,13 @@ I'll continue with the REMAINING tasks only, starting from where we left off."""
             content=ack_content,
             token_count=count_tokens(ack_content, self._model_name),
         )
-        self._messages.append(ack_item)
+        self._append(ack_item)
+
+        if tail:
+            self._preamble_length = len(self._messages)
+            for item in tail:
+                self._append(item)
+            return
 
         continue_content = (
             "Continue with the REMAINING work only. Do NOT repeat any completed actions. "
@@ -152,42 +303,126 @@ I'll continue with the REMAINING tasks only, starting from where we left off."""
             content=continue_content,
             token_count=count_tokens(continue_content, self._model_name),
         )
-        self._messages.append(continue_item)
+        self._append(continue_item)
+        self._preamble_length = len(self._messages)
+
+    def _restore_back_references(self, head: list[MessageItem], tail: list[MessageItem]) -> None:
+        """Put the content of reads folded into a summary back into the
+        first kept back-reference to them, and point later ones at it."""
+        originals = {item.tool_call_id: item for item in head if item.role == "tool" and item.tool_call_id}
+        restored: dict[str, str] = {}
+        for item in tail:
+            if item.role != "tool":
+                continue
+            reference = parse_back_reference(item.content)
+            if reference is None or reference[0] not in originals:
+                continue
+
+            call_id, path = reference
+            original = originals[call_id]
+            if call_id in restored:
+                content = back_reference(restored[call_id], path)
+                item.set_content(content, count_tokens(content, self._model_name))
+            elif not original.pruned_at:
+                item.set_content(original.content, original.token_count)
+                restored[call_id] = item.tool_call_id
+            else:
+                content = f"[Earlier read of {path} is no longer in the context; read the file again if needed]"
+                item.set_content(content, count_tokens(content, self._model_name))
 
     def prune_tool_outputs(self) -> int:
-        user_message_count = sum(1 for msg in self._messages if msg.role == "user")
+        if self.ledger.role_count("user") < 2:
+            return 0
 
-        if user_message_count < 2:
+        # Nothing can be pruned unless the tool outputs as a whole exceed
+        # both the protected window and the minimum worth pruning.
+        if self.ledger.role_tokens("tool") < self.PRUNE_PROTECT_TOKENS + self.PRUNE_MINIMUM_TOKENS:
             return 0
 
         total_tokens = 0
         pruned_tokens = 0
-        to_prune: list[MessageItem] = []
+        to_prune: list[int] = []
+        pinned = self.back_referenced_calls()
 
-        for msg in reversed(self._messages):
+        for index in range(len(self._messages)-1,-1,-1):
+            msg = self._messages[index]
             if msg.role == "tool" and msg.tool_call_id:
                 if msg.pruned_at:
                     break
 
-                tokens = msg.token_count or count_tokens(msg.content, self._model_name)
+                tokens = msg.token_count or 0
                 total_tokens += tokens
 
-                if total_tokens > self.PRUNE_PROTECT_TOKENS:
+                if total_tokens > self.PRUNE_PROTECT_TOKENS and msg.tool_call_id not in pinned:
                     pruned_tokens += tokens
-                    to_prune.append(msg)
+                    to_prune.append(index)
 
         if pruned_tokens < self.PRUNE_MINIMUM_TOKENS:
             return 0
 
         pruned_count = 0
 
-        for msg in to_prune:
-            msg.content = "[Old tool result content cleared]"
-            msg.token_count = count_tokens(msg.content, self._model_name)
-            msg.pruned_at = datetime.now()
+        for index in to_prune:
+            self._replace_content(index, "[Old tool result content cleared]")
+            self._messages[index].pruned_at = datetime.now()
             pruned_count += 1
 
         return pruned_count
 
+    def truncate_tool_output(
+        self,
+        index: int,
+        max_tokens: int,
+        suffix: str = "\n... [tool output truncated to fit the context window]",
+    ) -> None:
+        content = truncate_text(
+            self._messages[index].content,
+            self._model_name,
+            max_tokens,
+            suffix=suffix,
+            mode=TruncateMode.MIDDLE,
+        )
+        self._replace_content(index, content)
+
+    def elide_tool_output(
+        self, index: int, note: str = "[Tool output elided to fit the context window]"
+    ) -> None:
+        self._replace_content(index, note)
+        self._messages[index].pruned_at = datetime.now()
+
+    def replace_tool_call_arguments(self, index: int, call_id: str, arguments: str | dict[str, Any]) -> None:
+        msg = self._messages[index]
+        tool_calls = [
+            {**tc, "function": {**tc.get("function", {}), "arguments": arguments}}
+            if tc.get("id") == call_id
+            else tc
+            for tc in msg.tool_calls
+        ]
+
+        old_tokens = msg.token_count or 0
+        msg.tool_calls = tool_calls
+        msg.set_content(msg.content, self._count_message_tokens(msg.content, tool_calls))
+        self._message_dicts[index] = msg.to_dict()
+        self.ledger.update(msg.role, old_tokens, msg.token_count)
+
+    def _count_message_tokens(self, content: str, tool_calls: list[dict[str, Any]] | None = None) -> int:
+        return count_tokens(
+            (content or "") + (json.dumps(tool_calls) if tool_calls else ""),
+            self._model_name,
+        )
+
+    def _replace_content(self, index: int, content: str) -> None:
+        msg = self._messages[index]
+        old_tokens = msg.token_count or 0
+        msg.set_content(content, count_tokens(content, self._model_name))
+        self._message_dicts[index] = msg.to_dict()
+        self.ledger.update(msg.role, old_tokens, msg.token_count)
+
     def clear(self) -> None:
+        self.history_version += 1
+        self._summaries = []
+        self._preamble_length = 0
         self._messages = []
+        self._message_dicts = []
+        self._tool_results = {}
+        self.ledger.reset_messages()
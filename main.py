@@ -4,11 +4,12 @@ from typing import Any
 from agent.persistence import PersistenceManager, SessionSnapshot
 from agent.session import Session
 from client.llm_client import LLMClient
+from client.transport import close_http_clients
 import asyncio
 import click
 from agent.agent import Agent
 from agent.events import AgentEventType
-from config.config import ApprovalPolicy, Config
+from config.config import ApprovalPolicy, Config, ResponseCacheMode
 from config.loader import load_config
 from ui.tui import TUI,get_console
 
@@ -21,11 +22,20 @@ class CLI:
         self.tui = TUI(self.config,console)
 
     async def run_single(self,message:str)->str|None:
-        async with Agent(self.config) as agent:
-            self.agent = agent
-            return await self._process_message(message)
+        try:
+            async with Agent(self.config) as agent:
+                self.agent = agent
+                return await self._process_message(message)
+        finally:
+            await close_http_clients()
         
     async def run_interactive(self)->str|None:
+        try:
+            await self._run_interactive()
+        finally:
+            await close_http_clients()
+
+    async def _run_interactive(self)->None:
         self.tui.print_welcome(
             "AI Agent",
             lines=[
@@ -95,6 +105,15 @@ class CLI:
                     tool_kind,
                     event.data.get("arguments",{})
                 )
+
+            elif event.type==AgentEventType.TOOL_CALL_PROGRESS:
+                tool_name = event.data.get("name","unknown")
+                self.tui.tool_call_progress(
+                    event.data.get("call_id",""),
+                    tool_name,
+                    self._get_tool_kind(tool_name),
+                    event.data.get("output",""),
+                )
             
             elif event.type==AgentEventType.TOOL_CALL_COMPLETE:
                 tool_name = event.data.get("name","unknown")
@@ -310,14 +329,32 @@ class CLI:
     type=click.Path(exists=True,file_okay=False,path_type=Path),
     help="Current working directory"
 )
+@click.option(
+    '--cassette',
+    type=click.Path(file_okay=False,path_type=Path),
+    help="Directory to record LLM responses to, or replay them from"
+)
+@click.option(
+    '--cassette-mode',
+    type=click.Choice([ResponseCacheMode.RECORD.value,ResponseCacheMode.REPLAY.value]),
+    default=ResponseCacheMode.REPLAY.value,
+    show_default=True,
+    help="Whether --cassette records live responses or replays recorded ones"
+)
 def main(
     prompt:str|None,
-    cwd:Path|None
+    cwd:Path|None,
+    cassette:Path|None,
+    cassette_mode:str,
 ):
     try:
         config = load_config(cwd=cwd)
     except Exception as e:
         console.print(f"[error]configuration error: {e}[/error]")
+
+    if cassette:
+        config.response_cache.mode = ResponseCacheMode(cassette_mode)
+        config.response_cache.path = cassette
     
     errors = config.validate()
 
@@ -10,11 +10,14 @@ def get_system_prompt(
     tools: list[Tool] | None = None,
 ) -> str:
     parts = []
+    # With a stable prefix the date and memory move to the session context
+    # message, so this prompt is identical across turns and sessions.
+    stable = config.stable_prompt_prefix
 
     # Identity and role
     parts.append(_get_identity_section())
     # Environment
-    parts.append(_get_environment_section(config))
+    parts.append(_get_environment_section(config, include_date=not stable))
 
     if tools:
         parts.append(_get_tool_guidelines_section(tools))
@@ -31,7 +34,7 @@ def get_system_prompt(
     if config.user_instructions:
         parts.append(_get_user_instructions_section(config.user_instructions))
 
-    if user_memory:
+    if user_memory and not stable:
         parts.append(_get_memory_section(user_memory))
     # Operational guidelines
     parts.append(_get_operational_section())
@@ -39,6 +42,26 @@ def get_system_prompt(
     return "\n\n".join(parts)
 
 
+def get_session_context_prompt(
+    config: Config,
+    user_memory: str | None = None,
+) -> str | None:
+    """Volatile context that follows the stable system prompt."""
+    if not config.stable_prompt_prefix:
+        return None
+
+    parts = [
+        f"""# Session Context
+
+- **Current Date**: {datetime.now().strftime("%A, %B %d, %Y")}"""
+    ]
+
+    if user_memory:
+        parts.append(_get_memory_section(user_memory))
+
+    return "\n\n".join(parts)
+
+
 def _get_identity_section() -> str:
     """Generate the identity section."""
     return """# Identity
@@ -54,15 +77,18 @@ Your capabilities:
 You are pair programming with the user to help them accomplish their goals. You should be proactive, thorough and focused on delivering high-quality results."""
 
 
-def _get_environment_section(config: Config) -> str:
+def _get_environment_section(config: Config, include_date: bool = True) -> str:
     """Generate the environment section."""
-    now = datetime.now()
     os_info = f"{platform.system()} {platform.release()}"
+    date_line = (
+        f"- **Current Date**: {datetime.now().strftime('%A, %B %d, %Y')}\n"
+        if include_date
+        else ""
+    )
 
     return f"""# Environment
 
-- **Current Date**: {now.strftime("%A, %B %d, %Y")}
-- **Operating System**: {os_info}
+{date_line}- **Operating System**: {os_info}
 - **Working Directory**: {config.cwd}
 - **Shell**: {_get_shell_info()}
 
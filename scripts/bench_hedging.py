@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from client.llm_client import LLMClient
+from client.response import StreamEventType
+from client.transport import close_http_clients
+from config.config import Config, EndpointConfig, RoutingConfig
+
+REPLY = "Hello from the stub server."
+
+
+async def _serve_chat(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float, name: str) -> None:
+    """Minimal OpenAI-compatible /chat/completions that streams REPLY after delay seconds."""
+    try:
+        headers = {}
+        await reader.readline()
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers.get("content-length", 0)))
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        try:
+            # Returns early if the client hangs up, e.g. a cancelled hedge.
+            await asyncio.wait_for(reader.read(), timeout=delay)
+            return
+        except asyncio.TimeoutError:
+            pass
+        for word in REPLY.split(" "):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": name,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        done = {
+            "id": "stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": name,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        writer.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _start_stub(delay: float, name: str) -> tuple[asyncio.base_events.Server, str]:
+    server = await asyncio.start_server(lambda r, w: _serve_chat(r, w, delay, name), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/v1"
+
+
+async def _run(args: argparse.Namespace) -> None:
+    slow, slow_url = await _start_stub(args.slow_delay, "slow")
+    fast, fast_url = await _start_stub(args.fast_delay, "fast")
+    os.environ.setdefault("STUB_API_KEY", "stub")
+
+    config = Config(
+        endpoints=[
+            EndpointConfig(name="slow", base_url=slow_url, api_key_env="STUB_API_KEY", model="stub"),
+            EndpointConfig(name="fast", base_url=fast_url, api_key_env="STUB_API_KEY", model="stub"),
+        ],
+        routing=RoutingConfig(hedge=args.hedge, hedge_delay=args.hedge_delay),
+    )
+    client = LLMClient(config)
+    messages = [{"role": "user", "content": "hi"}]
+
+    try:
+        for i in range(args.requests):
+            start = time.perf_counter()
+            first_token = None
+            async for event in client.chat_completion(messages):
+                if event.type == StreamEventType.TEXT_DELTA and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event.type == StreamEventType.ERROR:
+                    print(f"request {i}: error {event.error}")
+            total = time.perf_counter() - start
+            print(f"request {i}: first token {first_token or 0:.3f}s, total {total:.3f}s")
+    finally:
+        await client.close()
+        await close_http_clients()
+        slow.close()
+        fast.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure time-to-first-token with and without hedging against two local stub servers")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--slow-delay", type=float, default=3.0, help="Seconds before the slow stub sends its first token")
+    parser.add_argument("--fast-delay", type=float, default=0.05, help="Seconds before the fast stub sends its first token")
+    parser.add_argument("--hedge-delay", type=float, default=0.5)
+    parser.add_argument("--no-hedge", dest="hedge", action="store_false")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.text import TruncateMode, count_tokens, truncate_text
+
+SIZES_MB = [1, 10, 100]
+MAX_TOKENS = 25000
+SUFFIX = "\n... [truncated]"
+
+
+def _legacy_truncate_by_lines(text: str, target_tokens: int, suffix: str, model: str) -> str:
+    lines = text.split("\n")
+    result_lines: list[str] = []
+    current_tokens = 0
+
+    for line in lines:
+        line_tokens = count_tokens(line + "\n", model)
+        if current_tokens + line_tokens > target_tokens:
+            break
+        result_lines.append(line)
+        current_tokens += line_tokens
+
+    if not result_lines:
+        return _legacy_truncate_by_chars(text, target_tokens, suffix, model)
+
+    return "\n".join(result_lines) + suffix
+
+
+def _legacy_truncate_by_chars(text: str, target_tokens: int, suffix: str, model: str) -> str:
+    low, high = 0, len(text)
+
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid], model) <= target_tokens:
+            low = mid
+        else:
+            high = mid - 1
+
+    return text[:low] + suffix
+
+
+def _legacy_truncate_text(text: str, model: str, max_tokens: int, preserve_lines: bool) -> str:
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    target_tokens = max_tokens - count_tokens(SUFFIX, model)
+
+    if preserve_lines:
+        return _legacy_truncate_by_lines(text, target_tokens, SUFFIX, model)
+    return _legacy_truncate_by_chars(text, target_tokens, SUFFIX, model)
+
+
+def _make_input(size_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["def", "return", "self", "value", "import", "class", "for", "in", "=", "(", ")", ":"]
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = f"{len(lines):6}|" + " ".join(rng.choice(words) for _ in range(rng.randint(2, 14)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def _time(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare truncate_text with the previous per-line/binary-search implementation")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES_MB, help="Input sizes in MB")
+    parser.add_argument("--legacy-max-mb", type=int, default=10, help="Skip the legacy implementation above this size")
+    args = parser.parse_args()
+
+    print(f"{'size':>6}  {'case':<22}{'legacy':>10}{'engine':>10}")
+    for size_mb in args.sizes:
+        text = _make_input(size_mb * 1024 * 1024)
+        run_legacy = size_mb <= args.legacy_max_mb
+
+        cases = [
+            ("head, lines", True, TruncateMode.HEAD),
+            ("head, chars", False, TruncateMode.HEAD),
+            ("middle, lines", True, TruncateMode.MIDDLE),
+        ]
+        for label, preserve_lines, mode in cases:
+            engine = _time(lambda: truncate_text(text, args.model, MAX_TOKENS, SUFFIX, preserve_lines, mode))
+            legacy = "-"
+            if run_legacy and mode == TruncateMode.HEAD:
+                legacy = f"{_time(lambda: _legacy_truncate_text(text, args.model, MAX_TOKENS, preserve_lines)):.3f}s"
+            print(f"{size_mb:>4}MB  {label:<22}{legacy:>10}{engine:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
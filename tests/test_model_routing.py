@@ -0,0 +1,43 @@
+import pytest
+
+from agent.agent import Agent
+from config.config import Config, ModelPurpose, ModelTiersConfig
+from context.manager import ContextManager
+
+
+def _agent(tmp_path, last_reply):
+    config = Config(
+        cwd=tmp_path,
+        models=ModelTiersConfig(fast="fast-model", route_short_turns=True),
+    )
+    agent = Agent(config)
+    agent.session.context_manager = ContextManager(config, user_memory=None, tools=[])
+    agent.session.context_manager.add_user_message("Add a --verbose flag to the CLI")
+    if last_reply is not None:
+        agent.session.context_manager.add_assistant_message(last_reply, None)
+    return agent
+
+
+@pytest.mark.parametrize("message", ["thanks", "Thank you!", "ok, got it", "Perfect, thanks."])
+def test_acknowledgements_go_to_the_fast_model(tmp_path, message):
+    agent = _agent(tmp_path, "Done, the flag is in cli.py.")
+    assert agent._first_turn_purpose(message) == ModelPurpose.FAST
+
+
+@pytest.mark.parametrize(
+    "message",
+    ["yes, go ahead", "go ahead", "ok, now add tests", "thanks, also update the README", "yes"],
+)
+def test_requests_for_more_work_stay_on_the_main_model(tmp_path, message):
+    agent = _agent(tmp_path, "Done, the flag is in cli.py.")
+    assert agent._first_turn_purpose(message) == ModelPurpose.MAIN
+
+
+def test_ok_to_a_question_stays_on_the_main_model(tmp_path):
+    agent = _agent(tmp_path, "Should I also update the tests?")
+    assert agent._first_turn_purpose("ok") == ModelPurpose.MAIN
+
+
+def test_opening_message_stays_on_the_main_model(tmp_path):
+    agent = _agent(tmp_path, None)
+    assert agent._first_turn_purpose("thanks") == ModelPurpose.MAIN
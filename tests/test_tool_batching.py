@@ -0,0 +1,200 @@
+import asyncio
+
+from pydantic import BaseModel
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from client.response import StreamEvent, StreamEventType, TextDelta, ToolCall
+from config.config import ApprovalPolicy, Config
+from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+
+
+class ProbeParams(BaseModel):
+    tag: str
+
+
+class ProbeTool(Tool):
+    """Records when each call starts and ends in a log shared by the test."""
+
+    schema = ProbeParams
+
+    def __init__(self, config, name, kind, log, delay=0.05):
+        super().__init__(config)
+        self.name = name
+        self.kind = kind
+        self.log = log
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        tag = invocation.params["tag"]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.log.append(("start", tag))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", tag))
+        self.active -= 1
+        return ToolResult.success_result(f"done {tag}")
+
+
+class ScriptedClient:
+    """Answers the first request with tool calls and the next with text."""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.requests = 0
+
+    async def chat_completion(self, messages, tools=None, stream=True, **kwargs):
+        self.requests += 1
+        if self.requests == 1:
+            for call_id, name, tag in self.calls:
+                yield StreamEvent(
+                    type=StreamEventType.TOOL_CALL_COMPLETE,
+                    tool_call=ToolCall(call_id=call_id, name=name, arguments={"tag": tag}),
+                )
+                await asyncio.sleep(0)
+        else:
+            yield StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta("ok"))
+        yield StreamEvent(type=StreamEventType.MESSAGE_COMPLETE)
+
+    async def close(self):
+        pass
+
+
+def _run(tmp_path, calls, **config):
+    log = []
+
+    async def main():
+        agent_config = Config(cwd=tmp_path, approval=ApprovalPolicy.YOLO, **config)
+        async with Agent(agent_config) as agent:
+            read = ProbeTool(agent_config, "probe_read", ToolKind.READ, log)
+            write = ProbeTool(agent_config, "probe_write", ToolKind.WRITE, log)
+            agent.session.tool_registry.register(read)
+            agent.session.tool_registry.register(write)
+            agent.session.client = ScriptedClient(calls)
+            events = [event async for event in agent.run("go")]
+            results = [
+                message
+                for message in agent.session.context_manager.get_messages()
+                if message.get("role") == "tool"
+            ]
+            return events, results, read
+
+    events, results, read = asyncio.run(main())
+    return log, events, results, read
+
+
+def test_batches_group_consecutive_reads(tmp_path):
+    async def main():
+        agent_config = Config(cwd=tmp_path)
+        agent = Agent(agent_config)
+        agent.session.tool_registry.register(ProbeTool(agent_config, "probe_read", ToolKind.READ, []))
+        agent.session.tool_registry.register(ProbeTool(agent_config, "probe_write", ToolKind.WRITE, []))
+        calls = [
+            ToolCall(call_id=tag, name=name, arguments={"tag": tag})
+            for tag, name in [
+                ("r1", "probe_read"),
+                ("r2", "probe_read"),
+                ("w1", "probe_write"),
+                ("r3", "probe_read"),
+                ("w2", "probe_write"),
+                ("w3", "probe_write"),
+            ]
+        ]
+        batches = agent._batch_tool_calls(calls)
+        return [[call.call_id for call in batch] for batch in batches]
+
+    assert asyncio.run(main()) == [["r1", "r2"], ["w1"], ["r3"], ["w2"], ["w3"]]
+
+
+def test_reads_run_in_parallel_and_report_in_order(tmp_path):
+    calls = [(f"c{i}", "probe_read", f"r{i}") for i in range(4)]
+    log, events, results, read = _run(tmp_path, calls)
+
+    assert read.max_active == 4
+    completed = [e.data["call_id"] for e in events if e.type == AgentEventType.TOOL_CALL_COMPLETE]
+    assert completed == ["c0", "c1", "c2", "c3"]
+    assert [m["tool_call_id"] for m in results] == ["c0", "c1", "c2", "c3"]
+    assert all(e.data["success"] for e in events if e.type == AgentEventType.TOOL_CALL_COMPLETE)
+
+
+def test_parallel_reads_respect_the_limit(tmp_path):
+    calls = [(f"c{i}", "probe_read", f"r{i}") for i in range(4)]
+    _, _, _, read = _run(tmp_path, calls, max_parallel_tool_calls=2, early_tool_dispatch=False)
+
+    assert read.max_active == 2
+
+
+def test_mutating_calls_wait_for_the_calls_before_them(tmp_path):
+    calls = [
+        ("c0", "probe_read", "r1"),
+        ("c1", "probe_write", "w1"),
+        ("c2", "probe_read", "r2"),
+        ("c3", "probe_read", "r3"),
+        ("c4", "probe_write", "w2"),
+    ]
+    log, events, results, _ = _run(tmp_path, calls)
+
+    def index(kind, tag):
+        return log.index((kind, tag))
+
+    assert index("end", "r1") < index("start", "w1")
+    assert index("end", "w1") < index("start", "r2")
+    assert index("end", "w1") < index("start", "r3")
+    assert max(index("end", "r2"), index("end", "r3")) < index("start", "w2")
+    assert [m["tool_call_id"] for m in results] == ["c0", "c1", "c2", "c3", "c4"]
+
+
+def test_sequential_when_parallel_calls_are_disabled(tmp_path):
+    calls = [(f"c{i}", "probe_read", f"r{i}") for i in range(3)]
+    log, _, _, read = _run(tmp_path, calls, parallel_tool_calls=False)
+
+    assert read.max_active == 1
+    assert log == [(kind, f"r{i}") for i in range(3) for kind in ("start", "end")]
+
+
+def test_invalid_parameters_become_an_error_result(tmp_path):
+    calls = [("c0", "probe_read", None)]
+    log, events, results, _ = _run(tmp_path, calls)
+
+    complete = [e for e in events if e.type == AgentEventType.TOOL_CALL_COMPLETE]
+    assert log == []
+    assert not complete[0].data["success"]
+    assert "Invalid parameters" in complete[0].data["error"]
+
+
+class FailingClient(ScriptedClient):
+    """Streams its tool calls and then fails before the message completes."""
+
+    async def chat_completion(self, messages, tools=None, stream=True, **kwargs):
+        for call_id, name, tag in self.calls:
+            yield StreamEvent(
+                type=StreamEventType.TOOL_CALL_COMPLETE,
+                tool_call=ToolCall(call_id=call_id, name=name, arguments={"tag": tag}),
+            )
+        await asyncio.sleep(0.01)
+        raise RuntimeError("stream dropped")
+
+
+def test_early_calls_are_cancelled_when_the_stream_fails(tmp_path):
+    log = []
+
+    async def main():
+        agent_config = Config(cwd=tmp_path, approval=ApprovalPolicy.YOLO)
+        async with Agent(agent_config) as agent:
+            agent.session.tool_registry.register(
+                ProbeTool(agent_config, "probe_read", ToolKind.READ, log, delay=1.0)
+            )
+            agent.session.client = FailingClient([("c0", "probe_read", "r1")])
+            try:
+                async for _ in agent.run("go"):
+                    pass
+            except RuntimeError:
+                pass
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    leftover = asyncio.run(main())
+
+    assert log == [("start", "r1")]
+    assert leftover == []
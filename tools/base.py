@@ -2,7 +2,7 @@ from __future__ import annotations
 import abc
 from enum import Enum
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncGenerator
 from pydantic import BaseModel, ValidationError
 from dataclasses import dataclass, field
 from pydantic.json_schema import model_json_schema
@@ -58,6 +58,16 @@ class ToolConfirmation:
     tool_name:str
     params:dict[str,Any]
     description:str
+    diff:FileDiff|None = None
+    affected_paths:list[Path] = field(default_factory=list)
+    command:str|None = None
+    is_dangerous:bool = False
+
+
+@dataclass
+class ToolProgress:
+    # A piece of output shown while the tool is still running.
+    output:str
 
 
 @dataclass
@@ -122,14 +132,18 @@ class Tool(abc.ABC):
     async def execute(self,invocation:ToolInvocation)->ToolResult:
         pass
 
-    def vaildate_params(self,params:dict[str,Any])->list[str]:
+    async def stream(self,invocation:ToolInvocation)->AsyncGenerator[ToolProgress|ToolResult,None]:
+        """Progress while the tool runs, then its ToolResult last."""
+        yield await self.execute(invocation)
+
+    def validate_params(self,params:dict[str,Any])->list[str]:
         schema = self.schema
         if isinstance(schema,type) and issubclass(schema,BaseModel):
             try:
                 schema(**params)
             except ValidationError as e:
                 errors = []
-                for error in e.errors:
+                for error in e.errors():
                     field = ".".join(str(x) for x in error.get("loc",[]))
                     msg = error.get("msg","Validation error")
                     errors.append(f"Parameter '{field}':'{msg}'")
@@ -179,12 +193,31 @@ class Tool(abc.ABC):
                 "description":self.description,
             }
 
-            if "paramters" in schema:
+            if "parameters" in schema:
                 result["parameters"] = schema["parameters"]
             else:
                 result["parameters"] = schema
             return result
 
         raise ValueError(f"Invalid schema type for tool {self.name}:{type(schema)}")
-                
 
+
+class StreamingTool(Tool):
+    """A tool written as an async generator that reports partial results.
+
+    Subclasses implement stream(); execute() drains it for callers that
+    only want the final result.
+    """
+
+    @abc.abstractmethod
+    async def stream(self,invocation:ToolInvocation)->AsyncGenerator[ToolProgress|ToolResult,None]:
+        yield ToolResult.error_result("Not implemented")
+
+    async def execute(self,invocation:ToolInvocation)->ToolResult:
+        result = None
+        async for item in self.stream(invocation):
+            if isinstance(item,ToolResult):
+                result = item
+        if result is None:
+            return ToolResult.error_result(f"Tool {self.name} returned no result")
+        return result
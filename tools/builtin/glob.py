@@ -1,10 +1,13 @@
-import os
+import asyncio
+from itertools import islice
 from pathlib import Path
-import re
-from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from typing import AsyncGenerator, Iterator
+from tools.base import StreamingTool, ToolInvocation, ToolKind, ToolProgress, ToolResult
+from tools.file_index import get_file_index, glob_to_regex
+from tools.traversal import get_ignore_matcher, walk_files
 from pydantic import BaseModel, Field
 
-from utils.paths import is_binary_file, resolve_path
+from utils.paths import resolve_path
 
 
 class GlobParams(BaseModel):
@@ -14,7 +17,11 @@ class GlobParams(BaseModel):
     )
 
 
-class GlobTool(Tool):
+MAX_RESULTS = 1000
+BATCH_SIZE = 200
+
+
+class GlobTool(StreamingTool):
     name = "glob"
     description = (
         "Find files matching a glob pattern. Supports ** for recursive matching."
@@ -22,59 +29,92 @@ class GlobTool(Tool):
     kind = ToolKind.READ
     schema = GlobParams
 
-    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+    async def stream(
+        self, invocation: ToolInvocation
+    ) -> AsyncGenerator[ToolProgress | ToolResult, None]:
         params = GlobParams(**invocation.params)
 
         search_path = resolve_path(invocation.cwd, params.path)
 
         if not search_path.exists() or not search_path.is_dir():
-            return ToolResult.error_result(f"Directory does not exist: {search_path}")
-
-        try:
-            matches = list(search_path.glob(params.pattern))
-            matches = [p for p in matches if p.is_file()]
-        except Exception as e:
-            return ToolResult.error_result(f"Error searching: {e}")
+            yield ToolResult.error_result(f"Directory does not exist: {search_path}")
+            return
 
         output_lines = []
+        match_count = 0
+        truncated = False
 
-        for file_path in matches[:1000]:
-            try:
-                rel_path = file_path.relative_to(invocation.cwd)
-            except Exception:
-                rel_path = file_path
-
-            output_lines.append(str(rel_path))
+        try:
+            # One match past the limit shows the output is cut short; the
+            # walk stops there rather than counting the rest.
+            matches = islice(
+                await self._glob(search_path, params.pattern, invocation.cwd),
+                MAX_RESULTS + 1,
+            )
+            # Pulled in batches, so a slow walk shows matches as it finds them.
+            while batch := await asyncio.to_thread(list, islice(matches, BATCH_SIZE)):
+                batch_lines = []
+                for file_path in batch[: max(MAX_RESULTS - match_count, 0)]:
+                    try:
+                        rel_path = file_path.relative_to(invocation.cwd)
+                    except Exception:
+                        rel_path = file_path
+
+                    batch_lines.append(str(rel_path))
+
+                match_count += len(batch_lines)
+                truncated = truncated or len(batch_lines) < len(batch)
+                if batch_lines:
+                    output_lines.extend(batch_lines)
+                    yield ToolProgress("\n".join(batch_lines))
+        except Exception as e:
+            yield ToolResult.error_result(f"Error searching: {e}")
+            return
 
-        if len(matches) > 1000:
-            output_lines.append(f"...(limited to 1000 results)")
+        if truncated:
+            output_lines.append(f"...(limited to {MAX_RESULTS} results)")
 
-        return ToolResult.success_result(
+        yield ToolResult.success_result(
             "\n".join(output_lines),
             metadata={
                 "path": str(search_path),
-                "matches": len(matches),
+                "matches": match_count,
             },
+            truncated=truncated,
         )
 
-    def _find_files(self, search_path: Path) -> list[Path]:
-        files = []
-
-        for root, dirs, filenames in os.walk(search_path):
-            dirs[:] = [
-                d
-                for d in dirs
-                if d not in {"node_modules", "__pycache__", ".git", ".venv", "venv"}
-            ]
-
-            for filename in filenames:
-                if filename.startswith("."):
-                    continue
-
-                file_path = Path(root) / filename
-                if not is_binary_file(file_path):
-                    files.append(file_path)
-                    if len(files) >= 500:
-                        return files
-
-        return files
\ No newline at end of file
+    async def _glob(self, search_path: Path, pattern: str, cwd: Path) -> Iterator[Path]:
+        parts = [part for part in pattern.replace("\\", "/").split("/") if part not in ("", ".")]
+        if Path(pattern).is_absolute() or ".." in parts:
+            return (p for p in search_path.glob(pattern) if p.is_file())
+
+        if not any(char in pattern for char in "*?["):
+            # A plain path is returned even if it is ignored.
+            file_path = search_path.joinpath(*parts)
+            return iter([file_path] if file_path.is_file() else [])
+
+        # Walk from the pattern's literal directories, so a pattern naming
+        # an ignored directory (e.g. node_modules/**/*.js) still searches it.
+        literal = []
+        for part in parts[:-1]:
+            if any(char in part for char in "*?["):
+                break
+            literal.append(part)
+        start = search_path.joinpath(*literal)
+
+        index = get_file_index(cwd, self.config.file_index, self.config.ignore)
+        if index is not None and index.covers(start):
+            await asyncio.to_thread(index.refresh)
+            return iter(index.glob(pattern, search_path))
+
+        return self._walk_glob(search_path, start, pattern)
+
+    def _walk_glob(self, search_path: Path, start: Path, pattern: str) -> Iterator[Path]:
+        if not start.is_dir():
+            return
+
+        regex = glob_to_regex(pattern)
+        matcher = get_ignore_matcher(start, self.config.ignore)
+        for file_path in walk_files(start, matcher):
+            if regex.fullmatch(file_path.relative_to(search_path).as_posix()):
+                yield file_path
@@ -1,7 +1,12 @@
-import os
+import asyncio
 from pathlib import Path
 import re
-from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from typing import AsyncGenerator
+from tools.base import StreamingTool, ToolInvocation, ToolKind, ToolProgress, ToolResult
+from tools.file_index import get_file_index
+from tools.grep_engine import GrepEngine
+from tools.traversal import get_ignore_matcher, walk_files
+from tools.trigram_index import get_trigram_index
 from pydantic import BaseModel, Field
 
 from utils.paths import is_binary_file, resolve_path
@@ -18,100 +23,107 @@ class GrepParams(BaseModel):
     )
 
 
-class GrepTool(Tool):
+class GrepTool(StreamingTool):
     name = "grep"
     description = "Search for a regex pattern in file contents. Returns matching lines with file paths and line numbers."
     kind = ToolKind.READ
     schema = GrepParams
 
-    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+    async def stream(
+        self, invocation: ToolInvocation
+    ) -> AsyncGenerator[ToolProgress | ToolResult, None]:
         params = GrepParams(**invocation.params)
 
         search_path = resolve_path(invocation.cwd, params.path)
 
         if not search_path.exists():
-            return ToolResult.error_result(f"Path does not exist: {search_path}")
+            yield ToolResult.error_result(f"Path does not exist: {search_path}")
+            return
 
         try:
             flags = re.IGNORECASE if params.case_insensitive else 0
-            pattern = re.compile(params.pattern, flags)
+            re.compile(params.pattern, flags)
         except re.error as e:
-            return ToolResult.error_result(f"Invalid regex pattern: {e}")
+            yield ToolResult.error_result(f"Invalid regex pattern: {e}")
+            return
 
         if search_path.is_dir():
-            files = self._find_files(search_path)
+            files = await self._find_files(search_path, invocation.cwd, params.pattern, flags)
         else:
             files = [search_path]
 
         output_lines = []
-        matches = 0
-
-        for file_path in files:
-            try:
-                content = file_path.read_text(encoding="utf-8")
-            except Exception:
-                continue
-
-            lines = content.splitlines()
-            file_matches = False
-
-            # === path.py ===
-            # 1: async def execute()
-            # 30: async def execute()
-
-            # === path2.py ===
-            # 1: async def execute()
-            # 30: async def execute()
-            for i, line in enumerate(lines, start=1):
-                if pattern.search(line):
-                    matches += 1
-                    if not file_matches:
-                        rel_path = file_path.relative_to(invocation.cwd)
-                        output_lines.append(f"=== {rel_path} ===")
-                        file_matches = True
-
-                    output_lines.append(f"{i}:{line}")
-
-            if file_matches:
-                output_lines.append("")
+        engine = GrepEngine(self.config.grep)
+
+        # === path.py ===
+        # 1: async def execute()
+        # 30: async def execute()
+
+        # === path2.py ===
+        # 1: async def execute()
+        # 30: async def execute()
+        async for file_matches in engine.search(files, params.pattern, flags):
+            rel_path = file_matches.path.relative_to(invocation.cwd)
+            file_lines = [f"=== {rel_path} ==="]
+            for line_no, line in file_matches.lines:
+                file_lines.append(f"{line_no}:{line}")
+            file_lines.append("")
+            output_lines.extend(file_lines)
+            yield ToolProgress("\n".join(file_lines))
 
         if not output_lines:
-            return ToolResult.success_result(
+            yield ToolResult.success_result(
                 f"No matches found for pattern '{params.pattern}'",
                 metadata={
                     "path": str(search_path),
                     "matches": 0,
-                    "files_searched": len(files),
+                    "files_searched": engine.files_searched,
                 },
             )
+            return
 
-        return ToolResult.success_result(
+        if engine.truncated:
+            output_lines.append(
+                f"...(stopped after {engine.matches} matches; narrow the pattern or path to see more)"
+            )
+
+        yield ToolResult.success_result(
             "\n".join(output_lines),
             metadata={
                 "path": str(search_path),
-                "matches": matches,
-                "files_searched": len(files),
+                "matches": engine.matches,
+                "files_searched": engine.files_searched,
+                "truncated": engine.truncated,
             },
         )
 
-    def _find_files(self, search_path: Path) -> list[Path]:
+    async def _find_files(
+        self, search_path: Path, cwd: Path, pattern: str, flags: int
+    ) -> list[Path]:
+        index = get_file_index(cwd, self.config.file_index, self.config.ignore)
+        if index is None or not index.covers(search_path):
+            return await asyncio.to_thread(self._walk_files, search_path)
+
+        await asyncio.to_thread(index.refresh)
+        entries = [
+            entry for entry in index.files(search_path) if not entry.name.startswith(".")
+        ]
+        trigram_index = get_trigram_index(index, self.config.trigram_index)
+        if trigram_index is not None:
+            entries = await asyncio.to_thread(
+                trigram_index.candidates, entries, pattern, flags
+            )
+        return [index.root / entry.path for entry in entries]
+
+    def _walk_files(self, search_path: Path) -> list[Path]:
         files = []
+        matcher = get_ignore_matcher(search_path, self.config.ignore)
+
+        for file_path in walk_files(search_path, matcher):
+            if file_path.name.startswith("."):
+                continue
 
-        for root, dirs, filenames in os.walk(search_path):
-            dirs[:] = [
-                d
-                for d in dirs
-                if d not in {"node_modules", "__pycache__", ".git", ".venv", "venv"}
-            ]
-
-            for filename in filenames:
-                if filename.startswith("."):
-                    continue
-
-                file_path = Path(root) / filename
-                if not is_binary_file(file_path):
-                    files.append(file_path)
-                    if len(files) >= 500:
-                        return files
+            if not is_binary_file(file_path):
+                files.append(file_path)
 
         return files
\ No newline at end of file
@@ -1,5 +1,8 @@
+import asyncio
+from pathlib import Path
 from pydantic import BaseModel, Field
 from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from tools.file_index import get_file_index
 from utils.paths import resolve_path
 
 
@@ -26,14 +29,14 @@ class ListDirTool(Tool):
             )
 
         try:
-            items = sorted(dir_path.iterdir(),key=lambda p:(not p.is_dir(),p.name.lower()))
+            items = await asyncio.to_thread(self._list,dir_path,invocation)
         except Exception as e:
             return ToolResult.error_result(
                 f"Failed to list directory {dir_path}: {e}",
             )
         
         if not params.include_hidden:
-            items = [item for item in items if not item.name.startswith('.')]
+            items = [item for item in items if not item[0].startswith('.')]
 
         if not items:
             return ToolResult.success_result(
@@ -45,11 +48,11 @@ class ListDirTool(Tool):
             )  
 
         lines = []
-        for item in items:
-            if item.is_dir():
-                lines.append(f"{item.name}/")
+        for name,is_dir in items:
+            if is_dir:
+                lines.append(f"{name}/")
             else:
-                lines.append(f"{item.name}") 
+                lines.append(f"{name}") 
 
         return ToolResult.success_result(
             output="\n".join(lines),
@@ -57,4 +60,15 @@ class ListDirTool(Tool):
                 "path": str(dir_path),
                 "entries": len(items),
             }  
-        )
\ No newline at end of file
+        )
+
+    def _list(self,dir_path:Path,invocation:ToolInvocation)->list[tuple[str,bool]]:
+        """(name, is_dir) pairs, directories first."""
+        index = get_file_index(invocation.cwd,self.config.file_index,self.config.ignore)
+        listing = index.list_dir(dir_path) if index else None
+        if listing is None:
+            items = [(p.name,p.is_dir()) for p in dir_path.iterdir()]
+        else:
+            dirs,files = listing
+            items = [(name,True) for name in dirs]+[(name,False) for name in files]
+        return sorted(items,key=lambda item:(not item[1],item[0].lower()))
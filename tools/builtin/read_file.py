@@ -1,8 +1,9 @@
+import hashlib
 from pydantic import BaseModel, Field
 
 from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
 from utils.paths import is_binary_file, resolve_path
-from utils.text import count_tokens, truncate_text
+from utils.text import truncate_text
 
 class ReadFileParams(BaseModel):
     path:str = Field(
@@ -38,7 +39,8 @@ class ReadFileTool(Tool):
         if not path.is_file():
             return ToolResult.error_result(f"Path is not a file: {path}")
         
-        file_size = path.stat().st_size
+        stat = path.stat()
+        file_size = stat.st_size
         if file_size > self.MAX_FILE_SIZE:
             return ToolResult.error_result(
                 f"file too large ({file_size/(1024*1024):.1f}MB)"
@@ -80,16 +82,14 @@ class ReadFileTool(Tool):
                 formatted_lines.append(f"{i:6}|{line}")
 
             output = "\n".join(formatted_lines)
-            token_count = count_tokens(output)
-
-            truncated = False
-            if  token_count>self.MAX_OUTPUT_TOKENS:
-                output =  truncate_text(
-                    output,
-                    self.MAX_OUTPUT_TOKENS,
-                    suffix = f"\n...[truncated {total_lines} total lines]"
-                )
-                truncated = True
+            full_output = output
+            output =  truncate_text(
+                output,
+                self.config.model.name,
+                self.MAX_OUTPUT_TOKENS,
+                suffix = f"\n...[truncated {total_lines} total lines]"
+            )
+            truncated = output != full_output
             
             metadata_lines = []
             if start_idx>0 or end_idx<total_lines:
@@ -107,6 +107,8 @@ class ReadFileTool(Tool):
                     "total_lines":total_lines,
                     "shown_start":start_idx+1,
                     "shown_end":end_idx,
+                    "mtime_ns":stat.st_mtime_ns,
+                    "content_hash":hashlib.sha256(output.encode("utf-8","surrogatepass")).hexdigest(),
                 },
             )
         except Exception as e:
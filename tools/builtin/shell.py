@@ -5,6 +5,7 @@ from pathlib import Path
 import sys
 from pydantic import BaseModel, Field
 from tools.base import Tool, ToolConfirmation, ToolInvocation, ToolKind, ToolResult
+from utils.text import TruncateMode, truncate_text
 
 
 BLOCKED_COMMANDS = {
@@ -40,6 +41,8 @@ class ShellTool(Tool):
 
     schema = ShellParams
 
+    MAX_OUTPUT_TOKENS = 25000
+
 
     async def get_confirmation(
         self, invocation: ToolInvocation
@@ -132,14 +135,24 @@ class ShellTool(Tool):
         if exit_code!=0:
             output += "\n Exit Code: {exit_code}\n" 
 
-        if len(output)>100*1024:
-            output = output[:100*1024] + "\n\n[Output truncated]\n"
+        # The end of a command's output (errors, summaries) usually
+        # matters as much as the start, so elide the middle.
+        full_output = output
+        output = truncate_text(
+            output,
+            self.config.model.name,
+            self.MAX_OUTPUT_TOKENS,
+            suffix="\n\n[Output truncated]\n",
+            mode=TruncateMode.MIDDLE,
+        )
+        truncated = output != full_output
 
         return ToolResult(
             success = exit_code==0,
             error=stderr if exit_code!=0 else None,
             exit_code=exit_code,
-            output=output
+            output=output,
+            truncated=truncated,
         )
 
     def _build_environment(self)->dict[str,str]:
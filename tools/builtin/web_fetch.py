@@ -3,6 +3,7 @@ from urllib.parse import urlparse
 import httpx
 from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
 from pydantic import BaseModel, Field
+from utils.text import truncate_text
 
 
 class WebFetchParams(BaseModel):
@@ -21,6 +22,8 @@ class WebFetchTool(Tool):
     kind = ToolKind.NETWORK
     schema = WebFetchParams
 
+    MAX_OUTPUT_TOKENS = 25000
+
     async def execute(self, invocation: ToolInvocation) -> ToolResult:
         params = WebFetchParams(**invocation.params)
 
@@ -43,11 +46,18 @@ class WebFetchTool(Tool):
         except Exception as e:
             return ToolResult.error_result(f"Request failed: {e}")
 
-        if len(text) > 100 * 1024:
-            text = text[: 100 * 1024] + "\n... [content truncated]"
+        full_text = text
+        text = truncate_text(
+            text,
+            self.config.model.name,
+            self.MAX_OUTPUT_TOKENS,
+            suffix="\n... [content truncated]",
+        )
+        truncated = text != full_text
 
         return ToolResult.success_result(
             text,
+            truncated=truncated,
             metadata={
                 "status_code": response.status_code,
                 "content_length": len(response.content),
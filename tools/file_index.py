@@ -0,0 +1,363 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from config.config import FileIndexConfig, IgnoreConfig
+from config.loader import get_data_dir
+from tools.traversal import IgnoreMatcher, get_ignore_matcher
+from utils.paths import guess_language, is_binary_file
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    is_binary: bool
+    language: str
+
+    @property
+    def name(self) -> str:
+        return self.path.rpartition("/")[2]
+
+
+@dataclass
+class DirEntry:
+    mtime_ns: int
+    dirs: list[str] = field(default_factory=list)
+    files: list[str] = field(default_factory=list)
+    # Subdirectories that are not symlinks.
+    real_dirs: list[str] = field(default_factory=list)
+
+
+class FileIndex:
+    """In-memory index of the files under a workspace root.
+
+    Paths are relative to the root and use "/" separators. refresh()
+    rescans incrementally: a directory is listed again only when its
+    mtime changed, and a file is checked for binary content again only
+    when its size or mtime changed. Full rescans are at most one per
+    refresh_interval; writes made by the agent's own tools are applied
+    right away through update() and mark_stale(). Ignored files and
+    directories are left out; the listings keep every name, and the
+    ignore rules are applied on each refresh so edits to them count.
+    """
+
+    def __init__(self, root: Path, config: FileIndexConfig, ignore: IgnoreMatcher):
+        self.root = root
+        self.config = config
+        self.ignore = ignore
+        self._files: dict[str, FileEntry] = {}
+        self._dirs: dict[str, DirEntry] = {}
+        self._refreshed_at: float | None = None
+        self._lock = threading.RLock()
+        self._cache_path = (
+            get_data_dir() / "file_index" / f"{hashlib.sha1(str(root).encode()).hexdigest()[:16]}.json"
+            if config.persist
+            else None
+        )
+        self._load()
+
+    def covers(self, path: Path) -> bool:
+        rel = self._relative(path)
+        if rel is None:
+            return False
+        return not self.ignore.is_ignored(rel, path.is_dir())
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            if (
+                not force
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.config.refresh_interval
+            ):
+                return
+
+            files: dict[str, FileEntry] = {}
+            dirs: dict[str, DirEntry] = {}
+            pending = [""]
+            while pending:
+                rel_dir = pending.pop()
+                entry = self._scan_dir(rel_dir)
+                if entry is None:
+                    continue
+                dirs[rel_dir] = entry
+                self.ignore.enter(rel_dir, entry.files)
+                for name in entry.files:
+                    rel = f"{rel_dir}/{name}" if rel_dir else name
+                    if self.ignore.excluded(rel, False):
+                        continue
+                    file_entry = self._stat_file(rel, self._files.get(rel))
+                    if file_entry is not None:
+                        files[rel] = file_entry
+                for name in entry.real_dirs:
+                    rel = f"{rel_dir}/{name}" if rel_dir else name
+                    if not self.ignore.excluded(rel, True):
+                        pending.append(rel)
+
+            changed = files != self._files or dirs.keys() != self._dirs.keys()
+            self._files = files
+            self._dirs = dirs
+            self._refreshed_at = time.monotonic()
+            if changed:
+                self._save()
+
+    def mark_stale(self) -> None:
+        """Force a rescan on the next query, e.g. after a shell command."""
+        with self._lock:
+            self._refreshed_at = None
+
+    def update(self, path: Path) -> None:
+        """Apply a change to one file written by the agent."""
+        rel = self._relative(path)
+        if not rel or not self.covers(path):
+            return
+
+        with self._lock:
+            if self._refreshed_at is None:
+                return
+            parent, _, name = rel.rpartition("/")
+            entry = self._stat_file(rel, self._files.get(rel))
+            if entry is None:
+                self._files.pop(rel, None)
+                self._refreshed_at = None
+                return
+
+            self._files[rel] = entry
+            dir_entry = self._dirs.get(parent)
+            if dir_entry is None:
+                # A new directory; let the next scan pick it up.
+                self._refreshed_at = None
+            elif name not in dir_entry.files:
+                dir_entry.files.append(name)
+                dir_entry.files.sort()
+
+    def files(self, under: Path | None = None, include_binary: bool = False) -> list[FileEntry]:
+        """Indexed files below under (the root by default), sorted by path."""
+        self.refresh()
+        prefix = self._prefix(under)
+        if prefix is None:
+            return []
+
+        with self._lock:
+            entries = [
+                entry
+                for rel, entry in self._files.items()
+                if rel.startswith(prefix) and (include_binary or not entry.is_binary)
+            ]
+        return sorted(entries, key=lambda e: e.path)
+
+    def glob(self, pattern: str, under: Path | None = None) -> list[Path]:
+        """Files below under whose path relative to it matches pattern."""
+        prefix = self._prefix(under)
+        if prefix is None:
+            return []
+
+        regex = glob_to_regex(pattern)
+        matches = []
+        for entry in self.files(under, include_binary=True):
+            if regex.fullmatch(entry.path[len(prefix):]):
+                matches.append(self.root / entry.path)
+        return matches
+
+    def list_dir(self, path: Path) -> tuple[list[str], list[str]] | None:
+        """Subdirectory and file names of path, or None if it is not indexed."""
+        rel = self._relative(path)
+        if rel is None or not self.covers(path):
+            return None
+
+        with self._lock:
+            if self._refreshed_at is None:
+                self.refresh()
+            entry = self._dirs.get(rel)
+            if entry is None:
+                return None
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                return None
+            if mtime_ns != entry.mtime_ns:
+                # Only this directory changed; the rest of the index is
+                # brought up to date by the next full refresh.
+                entry = self._scan_dir(rel)
+                if entry is None:
+                    return None
+                self._dirs[rel] = entry
+            return list(entry.dirs), list(entry.files)
+
+    def _scan_dir(self, rel_dir: str) -> DirEntry | None:
+        path = self.root / rel_dir if rel_dir else self.root
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._dirs.get(rel_dir)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        entry = DirEntry(mtime_ns=mtime_ns)
+        try:
+            with os.scandir(path) as it:
+                for child in it:
+                    try:
+                        if child.is_dir():
+                            entry.dirs.append(child.name)
+                            if not child.is_symlink():
+                                entry.real_dirs.append(child.name)
+                        elif child.is_file():
+                            entry.files.append(child.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+
+        entry.dirs.sort()
+        entry.files.sort()
+        return entry
+
+    def _stat_file(self, rel: str, previous: FileEntry | None) -> FileEntry | None:
+        path = self.root / rel
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        if previous is not None and previous.size == st.st_size and previous.mtime_ns == st.st_mtime_ns:
+            return previous
+        return FileEntry(
+            path=rel,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            is_binary=is_binary_file(path),
+            language=guess_language(rel),
+        )
+
+    def _relative(self, path: Path) -> str | None:
+        try:
+            rel = path.resolve().relative_to(self.root)
+        except (OSError, ValueError):
+            return None
+        rel_str = rel.as_posix()
+        return "" if rel_str == "." else rel_str
+
+    def _prefix(self, under: Path | None) -> str | None:
+        if under is None:
+            return ""
+        rel = self._relative(under)
+        if rel is None:
+            return None
+        return f"{rel}/" if rel else ""
+
+    def _load(self) -> None:
+        if self._cache_path is None or not self._cache_path.exists():
+            return
+        try:
+            with open(self._cache_path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+            self._files = {item[0]: FileEntry(*item) for item in data["files"]}
+            self._dirs = {rel: DirEntry(**value) for rel, value in data["dirs"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("Ignoring unreadable file index %s: %s", self._cache_path, e)
+            self._files = {}
+            self._dirs = {}
+
+    def _save(self) -> None:
+        if self._cache_path is None:
+            return
+        data = {
+            "files": [
+                [e.path, e.size, e.mtime_ns, e.is_binary, e.language] for e in self._files.values()
+            ],
+            "dirs": {rel: entry.__dict__ for rel, entry in self._dirs.items()},
+        }
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp)
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            logger.debug("Failed to save file index %s: %s", self._cache_path, e)
+
+
+def glob_to_regex(pattern: str) -> re.Pattern[str]:
+    """Compile a glob with Path.glob semantics: * stays within one path
+    component and a ** component matches any number of directories."""
+    parts = [part for part in pattern.replace("\\", "/").split("/") if part not in ("", ".")]
+    regex = ""
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            regex += ".*" if last else "(?:[^/]+/)*"
+            continue
+
+        j = 0
+        while j < len(part):
+            char = part[j]
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char == "[":
+                start = j + 1
+                if part[start:start + 1] == "!":
+                    start += 1
+                if part[start:start + 1] == "]":
+                    start += 1
+                end = part.find("]", start)
+                if end == -1:
+                    regex += re.escape(char)
+                else:
+                    body = part[j + 1:end]
+                    if body.startswith("!"):
+                        body = "^" + body[1:]
+                    regex += f"[{body}]"
+                    j = end
+            else:
+                regex += re.escape(char)
+            j += 1
+        if not last:
+            regex += "/"
+    return re.compile(regex)
+
+
+_indexes: dict[Path, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(root: Path, config: FileIndexConfig, ignore: IgnoreConfig) -> FileIndex | None:
+    """Index shared by every tool working in the same root."""
+    if not config.enabled:
+        return None
+
+    root = root.resolve()
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = FileIndex(root, config, get_ignore_matcher(root, ignore))
+            _indexes[root] = index
+        return index
+
+
+def notify_file_changed(path: Path | None = None) -> None:
+    """Tell every index about a change made by a tool.
+
+    With a path, that file is updated in place; without one (e.g. after a
+    shell command) the indexes rescan on their next query.
+    """
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        if path is None:
+            index.mark_stale()
+        else:
+            index.update(path)
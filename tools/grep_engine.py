@@ -0,0 +1,173 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+import os
+from pathlib import Path
+import re
+import threading
+from typing import AsyncGenerator
+from config.config import GrepConfig
+
+# Files are handed to workers in batches of up to this many files or
+# bytes, whichever comes first, to keep per-task overhead small.
+BATCH_FILES = 64
+BATCH_BYTES = 4 * 1024 * 1024
+
+
+@dataclass
+class FileMatches:
+    path: Path
+    lines: list[tuple[int, str]]
+
+
+@lru_cache(maxsize=32)
+def _compile(pattern: str, flags: int) -> re.Pattern[str]:
+    return re.compile(pattern, flags | re.MULTILINE)
+
+
+def search_text(content: str, regex: re.Pattern[str], max_matches: int) -> list[tuple[int, str]]:
+    """Matching lines of content as (line number, line) pairs.
+
+    The buffer is searched as a whole rather than line by line; after a
+    match the search resumes at the next line, so each line is reported
+    once. A match running past the end of its line is only a candidate:
+    the line is searched on its own, as a line-based grep would.
+    """
+    if "\r" in content:
+        content = content.replace("\r\n", "\n")
+
+    results: list[tuple[int, str]] = []
+    line_no = 1
+    counted_to = 0
+    pos = 0
+    length = len(content)
+    while pos <= length and len(results) < max_matches:
+        match = regex.search(content, pos)
+        if match is None:
+            break
+        line_start = content.rfind("\n", 0, match.start()) + 1
+        line_no += content.count("\n", counted_to, line_start)
+        counted_to = line_start
+        if line_start >= length:
+            # An empty match after the final newline is not a line.
+            break
+        line_end = content.find("\n", match.start())
+        if line_end == -1:
+            line_end = length
+        line = content[line_start:line_end]
+        if match.end() <= line_end or regex.search(line) is not None:
+            results.append((line_no, line))
+        pos = line_end + 1
+    return results
+
+
+def search_files(paths: list[str], pattern: str, flags: int, max_matches: int) -> list[list[tuple[int, str]] | None]:
+    """Search a batch of files; None marks a file that could not be read.
+
+    Runs in worker threads or processes, so it takes plain strings.
+    """
+    regex = _compile(pattern, flags)
+    results: list[list[tuple[int, str]] | None] = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                content = fp.read()
+        except (OSError, UnicodeDecodeError):
+            results.append(None)
+            continue
+        results.append(search_text(content, regex, max_matches))
+    return results
+
+
+_executors: dict[tuple[bool, int], Executor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(config: GrepConfig) -> Executor:
+    key = (config.use_processes, config.workers)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            if config.use_processes:
+                executor = ProcessPoolExecutor(max_workers=config.workers)
+            else:
+                executor = ThreadPoolExecutor(max_workers=config.workers, thread_name_prefix="grep")
+            _executors[key] = executor
+        return executor
+
+
+def _batches(files: list[Path]) -> list[list[Path]]:
+    batches: list[list[Path]] = []
+    current: list[Path] = []
+    size = 0
+    for path in files:
+        try:
+            file_size = os.stat(path).st_size
+        except OSError:
+            file_size = 0
+        if current and (len(current) >= BATCH_FILES or size + file_size > BATCH_BYTES):
+            batches.append(current)
+            current, size = [], 0
+        current.append(path)
+        size += file_size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class GrepEngine:
+    """Searches many files in a worker pool and yields results in order.
+
+    Batches are submitted ahead of the consumer but only a bounded number
+    are in flight, so memory stays flat and the search stops soon after
+    max_matches is reached. The event loop only waits on futures.
+    """
+
+    def __init__(self, config: GrepConfig):
+        self.config = config
+        self.files_searched = 0
+        self.matches = 0
+        self.truncated = False
+
+    async def search(self, files: list[Path], pattern: str, flags: int = 0) -> AsyncGenerator[FileMatches, None]:
+        loop = asyncio.get_running_loop()
+        executor = _get_executor(self.config)
+        max_matches = self.config.max_matches
+
+        pending = deque(await asyncio.to_thread(_batches, files))
+        in_flight: deque[tuple[list[Path], Future]] = deque()
+
+        def submit() -> None:
+            while pending and len(in_flight) < self.config.workers * 2:
+                batch = pending.popleft()
+                # One match more than needed tells whether the output is cut short.
+                future = executor.submit(search_files, [str(p) for p in batch], pattern, flags, max_matches + 1)
+                in_flight.append((batch, future))
+
+        try:
+            submit()
+            while in_flight:
+                batch, future = in_flight.popleft()
+                results = await asyncio.wrap_future(future, loop=loop)
+                submit()
+                for path, lines in zip(batch, results):
+                    self.files_searched += 1
+                    if not lines:
+                        continue
+                    remaining = max_matches - self.matches
+                    if remaining == 0:
+                        self.truncated = True
+                        return
+                    if len(lines) > remaining:
+                        lines = lines[:remaining]
+                        self.truncated = True
+                    self.matches += len(lines)
+                    yield FileMatches(path=path, lines=lines)
+                    if self.truncated:
+                        return
+        finally:
+            for _, future in in_flight:
+                future.cancel()
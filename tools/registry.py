@@ -1,11 +1,13 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 from config.config import Config
 from hooks.hook_system import HookSystem
 from safety.approval import ApprovalContext, ApprovalDecision, ApprovalManager
-from tools.base import Tool, ToolInvocation, ToolResult
+from tools.base import Tool, ToolInvocation, ToolKind, ToolProgress, ToolResult
 import logging
 from tools.builtin import ReadFileTool, get_all_builtin_tools
+from tools.file_index import notify_file_changed
+from tools.trigram_index import notify_trigram_indexes
 from tools.subagent import SubagentTool, get_default_subagent_definitions
 
 logger = logging.getLogger(__name__)
@@ -16,6 +18,10 @@ class ToolRegistry:
         self._tools: dict[str, Tool] = {}
         self._mcp_tools: dict[str, Tool] = {}
         self.config = config
+        # Bumped on every change to the registered tools; the schema list is
+        # rebuilt only when this or the tool filter changes.
+        self.version = 0
+        self._schema_cache: tuple[tuple[Any, ...], list[dict[str, Any]]] | None = None
 
     @property
     def connected_mcp_servers(self) -> list[Tool]:
@@ -26,15 +32,18 @@ class ToolRegistry:
             logger.warning(f"Overwriting existing tool: {tool.name}")
 
         self._tools[tool.name] = tool
+        self.version += 1
         logger.debug(f"Registered tool: {tool.name}")
 
     def register_mcp_tool(self, tool: Tool) -> None:
         self._mcp_tools[tool.name] = tool
+        self.version += 1
         logger.debug(f"Registered MCP tool: {tool.name}")
 
     def unregister(self, name: str) -> bool:
         if name in self._tools:
             del self._tools[name]
+            self.version += 1
             return True
 
         return False
@@ -60,10 +69,30 @@ class ToolRegistry:
             allowed_set = set(self.config.allowed_tools)
             tools = [t for t in tools if t.name in allowed_set]
 
+        if self.config.stable_prompt_prefix:
+            # Registration order depends on MCP startup timing; a fixed
+            # order keeps the schemas identical across sessions.
+            tools.sort(key=lambda t: t.name)
+
         return tools
 
     def get_schemas(self) -> list[dict[str, Any]]:
-        return [tool.to_openai_schema() for tool in self.get_tools()]
+        """Schemas of the available tools.
+
+        The same list object is returned until the registry changes, so
+        callers can cache anything derived from it by identity.
+        """
+        allowed = self.config.allowed_tools
+        key = (
+            self.version,
+            tuple(allowed) if allowed else None,
+            self.config.stable_prompt_prefix,
+        )
+        if self._schema_cache is None or self._schema_cache[0] != key:
+            schemas = [tool.to_openai_schema() for tool in self.get_tools()]
+            self._schema_cache = (key, schemas)
+
+        return self._schema_cache[1]
 
     async def invoke(
         self,
@@ -72,6 +101,7 @@ class ToolRegistry:
         cwd: Path,
         hook_system: HookSystem,
         approval_manager: ApprovalManager | None = None,
+        on_progress: Callable[[ToolProgress], None] | None = None,
     ) -> ToolResult:
         tool = self.get(name)
         if tool is None:
@@ -129,7 +159,7 @@ class ToolRegistry:
                         return result
 
         try:
-            result = await tool.execute(invocation)
+            result = await self._run(tool, invocation, on_progress)
         except Exception as e:
             logger.exception(f"Tool {name} raised unexpected error")
             result = ToolResult.error_result(
@@ -140,9 +170,39 @@ class ToolRegistry:
                 },
             )
 
+        self._notify_file_indexes(tool, result)
         await hook_system.trigger_after_tool(name, params, result)
         return result
 
+    async def _run(
+        self,
+        tool: Tool,
+        invocation: ToolInvocation,
+        on_progress: Callable[[ToolProgress], None] | None,
+    ) -> ToolResult:
+        if on_progress is None:
+            return await tool.execute(invocation)
+
+        result = None
+        async for item in tool.stream(invocation):
+            if isinstance(item, ToolResult):
+                result = item
+            else:
+                on_progress(item)
+        if result is None:
+            return ToolResult.error_result(f"Tool {tool.name} returned no result")
+        return result
+
+    def _notify_file_indexes(self, tool: Tool, result: ToolResult) -> None:
+        if tool.kind == ToolKind.WRITE:
+            path = result.metadata.get("path")
+            notify_file_changed(Path(path) if path else None)
+            if path:
+                notify_trigram_indexes(Path(path))
+        elif tool.kind in {ToolKind.SHELL, ToolKind.MCP}:
+            # Any file may have changed.
+            notify_file_changed()
+
 
 def create_default_registry(config: Config) -> ToolRegistry:
     registry = ToolRegistry(config)
@@ -1,6 +1,6 @@
 import asyncio
 from typing import Any
-from config.config import Config
+from config.config import Config, ModelPurpose
 from tools.base import Tool, ToolInvocation, ToolResult
 from dataclasses import dataclass
 from pydantic import BaseModel, Field
@@ -52,6 +52,11 @@ class SubagentTool(Tool):
         config_dict["max_turns"] = self.definition.max_turns
         if self.definition.allowed_tools:
             config_dict["allowed_tools"] = self.definition.allowed_tools
+        subagent_model = self.config.model_tier(ModelPurpose.SUBAGENT)
+        if subagent_model:
+            config_dict["model"]["name"] = subagent_model
+            for endpoint in config_dict["endpoints"]:
+                endpoint["model"] = None
 
         subagent_config = Config(**config_dict)
 
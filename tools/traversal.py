@@ -0,0 +1,253 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Iterable, Iterator
+from config.config import IgnoreConfig
+
+logger = logging.getLogger(__name__)
+
+IGNORE_FILES = (".gitignore", ".ignore")
+
+
+@dataclass
+class IgnoreRule:
+    regex: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+    # Patterns containing a "/" match the path relative to the directory
+    # of the ignore file; others match the name at any depth below it.
+    anchored: bool
+    base: str
+
+    def matches(self, path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if not self.anchored:
+            return self.regex.fullmatch(name) is not None
+        if not path.startswith(self.base):
+            return False
+        return self.regex.fullmatch(path[len(self.base):]) is not None
+
+
+def parse_ignore(text: str, base: str = "") -> list[IgnoreRule]:
+    """Compile the lines of a .gitignore whose directory is base
+    ("" or "a/b/", relative to the top of the tree)."""
+    rules: list[IgnoreRule] = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        pattern = line.rstrip(" ")
+        if pattern.endswith("\\") and len(pattern) < len(line):
+            pattern += " "
+
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        elif pattern.startswith(("\\!", "\\#")):
+            pattern = pattern[1:]
+
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if not pattern:
+            continue
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        try:
+            regex = re.compile(_translate(pattern))
+        except re.error:
+            logger.debug("Skipping invalid ignore pattern %r", line)
+            continue
+        rules.append(IgnoreRule(regex, negate, dir_only, anchored, base))
+    return rules
+
+
+def _translate(pattern: str) -> str:
+    parts = pattern.split("/")
+    regex = ""
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            regex += ".*" if last else "(?:[^/]+/)*"
+            continue
+
+        j = 0
+        while j < len(part):
+            char = part[j]
+            if char == "\\" and j + 1 < len(part):
+                j += 1
+                regex += re.escape(part[j])
+            elif char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char == "[":
+                end = part.find("]", j + 2)
+                if end == -1:
+                    regex += re.escape(char)
+                else:
+                    body = part[j + 1:end]
+                    if body.startswith("!"):
+                        body = "^" + body[1:]
+                    regex += f"[{body}]"
+                    j = end
+            else:
+                regex += re.escape(char)
+            j += 1
+        if not last:
+            regex += "/"
+    return regex
+
+
+def _repo_top(root: Path) -> Path:
+    """The enclosing git work tree, so rules of parent directories apply."""
+    for path in (root, *root.parents):
+        if (path / ".git").exists():
+            return path
+    return root
+
+
+class IgnoreMatcher:
+    """Decides which files and directories under root are skipped.
+
+    Rules come from the configured exclude patterns, .git/info/exclude
+    and every .gitignore/.ignore from the top of the git work tree down;
+    as in git, the last matching rule wins. Compiled rules are cached per
+    directory. Walkers call enter() with a directory's listing so an
+    edited ignore file is reloaded, then excluded() for each child, which
+    assumes the parents were not excluded and so prunes whole subtrees.
+    """
+
+    def __init__(self, root: Path, config: IgnoreConfig):
+        self.root = root
+        self.config = config
+        self.top = _repo_top(root) if config.respect_gitignore else root
+        offset = root.relative_to(self.top).as_posix()
+        self._offset = "" if offset == "." else f"{offset}/"
+        self._base_rules = parse_ignore("\n".join(config.exclude))
+        if config.respect_gitignore:
+            self._base_rules += self._read_rules(self.top / ".git" / "info" / "exclude", "")
+        # directory (relative to top) -> (ignore file signature, rules)
+        self._dirs: dict[str, tuple[tuple, list[IgnoreRule]]] = {}
+        # directory (relative to top) -> rules of it and all its parents
+        self._chains: dict[str, list[IgnoreRule]] = {}
+        self._lock = threading.Lock()
+
+    def enter(self, rel_dir: str, names: Iterable[str]) -> None:
+        """Reload the rules of rel_dir if its ignore files changed."""
+        if not self.config.respect_gitignore:
+            return
+        names = set(names)
+        self._load(self._offset + rel_dir if rel_dir else self._offset.rstrip("/"), names)
+
+    def excluded(self, rel: str, is_dir: bool) -> bool:
+        """Whether rel (relative to root) matches a rule of its parents."""
+        path = self._offset + rel
+        parent, _, name = path.rpartition("/")
+        for rule in reversed(self._chain(parent)):
+            if rule.matches(path, name, is_dir):
+                return not rule.negate
+        return False
+
+    def is_ignored(self, rel: str, is_dir: bool) -> bool:
+        """Like excluded(), but also true when a parent directory is."""
+        parts = [part for part in rel.split("/") if part]
+        for i in range(len(parts)):
+            last = i == len(parts) - 1
+            if self.excluded("/".join(parts[:i + 1]), is_dir if last else True):
+                return True
+        return False
+
+    def _chain(self, dir_path: str) -> list[IgnoreRule]:
+        with self._lock:
+            chain = self._chains.get(dir_path)
+        if chain is not None:
+            return chain
+
+        if dir_path:
+            chain = self._chain(dir_path.rpartition("/")[0]) + self._rules(dir_path)
+        else:
+            chain = self._base_rules + self._rules("")
+        with self._lock:
+            self._chains[dir_path] = chain
+        return chain
+
+    def _rules(self, dir_path: str) -> list[IgnoreRule]:
+        with self._lock:
+            cached = self._dirs.get(dir_path)
+        if cached is not None:
+            return cached[1]
+        if not self.config.respect_gitignore:
+            return []
+        return self._load(dir_path, None)
+
+    def _load(self, dir_path: str, names: set[str] | None) -> list[IgnoreRule]:
+        directory = self.top / dir_path if dir_path else self.top
+        signature = []
+        for file_name in IGNORE_FILES:
+            if names is not None and file_name not in names:
+                continue
+            try:
+                st = os.stat(directory / file_name)
+            except OSError:
+                continue
+            signature.append((file_name, st.st_size, st.st_mtime_ns))
+        signature = tuple(signature)
+
+        with self._lock:
+            cached = self._dirs.get(dir_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        base = f"{dir_path}/" if dir_path else ""
+        rules: list[IgnoreRule] = []
+        for file_name, _, _ in signature:
+            rules += self._read_rules(directory / file_name, base)
+        with self._lock:
+            self._dirs[dir_path] = (signature, rules)
+            if cached is not None:
+                # Chains below this directory include the old rules.
+                self._chains.clear()
+        return rules
+
+    @staticmethod
+    def _read_rules(path: Path, base: str) -> list[IgnoreRule]:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as fp:
+                return parse_ignore(fp.read(), base)
+        except OSError:
+            return []
+
+
+def walk_files(path: Path, matcher: IgnoreMatcher) -> Iterator[Path]:
+    """Files below path, which must be matcher.root or inside it, skipping
+    ignored entries without descending into ignored directories."""
+    prefix = path.relative_to(matcher.root).as_posix()
+    prefix = "" if prefix == "." else f"{prefix}/"
+    for dirpath, dirs, filenames in os.walk(path):
+        rel_dir = Path(dirpath).relative_to(path).as_posix()
+        rel_dir = prefix + ("" if rel_dir == "." else f"{rel_dir}/")
+        matcher.enter(rel_dir.rstrip("/"), filenames)
+        dirs[:] = sorted(d for d in dirs if not matcher.excluded(rel_dir + d, True))
+        for filename in sorted(filenames):
+            if not matcher.excluded(rel_dir + filename, False):
+                yield Path(dirpath) / filename
+
+
+_matchers: dict[Path, IgnoreMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_ignore_matcher(root: Path, config: IgnoreConfig) -> IgnoreMatcher:
+    """Matcher shared by every walk starting at the same root."""
+    root = root.resolve()
+    with _matchers_lock:
+        matcher = _matchers.get(root)
+        if matcher is None:
+            matcher = IgnoreMatcher(root, config)
+            _matchers[root] = matcher
+        return matcher
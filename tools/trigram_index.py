@@ -0,0 +1,391 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from typing import Union
+from config.config import TrigramIndexConfig
+from config.loader import get_data_dir
+from tools.file_index import FileEntry, FileIndex
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants, sre_parse
+
+logger = logging.getLogger(__name__)
+
+# POSSESSIVE_REPEAT and ATOMIC_GROUP only exist on Python 3.11+.
+REPEATS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+MAGIC = b"TRG1"
+
+# Names the version directory holding the current postings.bin and
+# files.json; each build writes a new one and swaps this file in.
+CURRENT_FILE = "current"
+# Version directories of builds that never finished are removed after this.
+ORPHAN_AGE = 24 * 60 * 60
+
+# A required literal, all of a list of queries, or any of them.
+Query = Union[str, tuple[str, list["Query"]]]
+
+
+def trigrams(data: bytes) -> set[int]:
+    grams = {data[i:i + 3] for i in range(len(data) - 2)}
+    return {int.from_bytes(gram, "big") for gram in grams}
+
+
+def text_trigrams(text: str) -> set[int]:
+    # Case-folded so one index serves case-sensitive and -insensitive
+    # searches; the regex itself confirms every candidate.
+    return trigrams(text.casefold().encode("utf-8"))
+
+
+def required_literals(pattern: str, flags: int = 0) -> Query | None:
+    """Literals every match of pattern must contain, or None if unknown."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return None
+    return _required(parsed)
+
+
+def _required(parsed) -> Query | None:
+    required: list[Query] = []
+    run: list[str] = []
+
+    def flush() -> None:
+        if len(run) >= 3:
+            required.append("".join(run))
+        run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+
+        if op in REPEATS:
+            minimum, _, item = av
+            if minimum >= 1 and len(item) == 1 and item[0][0] is sre_constants.LITERAL:
+                # "abc+" still requires "abc".
+                run.append(chr(item[0][1]))
+
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            sub = _required(av[-1])
+        elif ATOMIC_GROUP is not None and op is ATOMIC_GROUP:
+            sub = _required(av)
+        elif op in REPEATS:
+            minimum, _, item = av
+            sub = _required(item) if minimum >= 1 else None
+        elif op is sre_constants.BRANCH:
+            alternatives = [_required(alt) for alt in av[1]]
+            sub = None if any(alt is None for alt in alternatives) else ("or", alternatives)
+        else:
+            sub = None
+        if sub is not None:
+            required.append(sub)
+    flush()
+
+    if not required:
+        return None
+    return required[0] if len(required) == 1 else ("and", required)
+
+
+def query_matches(query: Query, grams: set[int]) -> bool:
+    if isinstance(query, str):
+        return text_trigrams(query) <= grams
+    kind, parts = query
+    if kind == "and":
+        return all(query_matches(part, grams) for part in parts)
+    return any(query_matches(part, grams) for part in parts)
+
+
+@dataclass
+class IndexedFile:
+    file_id: int
+    size: int
+    mtime_ns: int
+    indexed: bool
+
+
+class Postings:
+    """Sorted trigram keys with their file-id lists, read from an mmap.
+
+    Layout after the 4-byte magic: key count (u32), keys (u32 each),
+    key_count + 1 offsets into the postings (u32 each), then the file
+    ids of every posting list back to back (u32 each).
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:4] != MAGIC:
+            raise ValueError(f"Not a trigram index: {path}")
+        (count,) = struct.unpack_from("=I", self._mmap, 4)
+        body = memoryview(self._mmap)[8:].cast("I")
+        self._keys = body[:count]
+        self._offsets = body[count:2 * count + 1]
+        self._ids = body[2 * count + 1:]
+
+    def lookup(self, gram: int) -> memoryview:
+        i = bisect_left(self._keys, gram)
+        if i == len(self._keys) or self._keys[i] != gram:
+            return self._ids[0:0]
+        return self._ids[self._offsets[i]:self._offsets[i + 1]]
+
+    @staticmethod
+    def write(path: Path, postings: dict[int, array]) -> None:
+        keys = array("I", sorted(postings))
+        offsets = array("I", [0])
+        for key in keys:
+            offsets.append(offsets[-1] + len(postings[key]))
+        with open(path, "wb") as fp:
+            fp.write(MAGIC)
+            fp.write(struct.pack("=I", len(keys)))
+            keys.tofile(fp)
+            offsets.tofile(fp)
+            for key in keys:
+                postings[key].tofile(fp)
+
+
+class TrigramIndex:
+    """Trigram inverted index narrowing grep to files that can match.
+
+    The index is built in a background thread from the text files of a
+    FileIndex and stored in the data dir, each build in a new version
+    directory that one rename makes current, so sessions sharing a root
+    never see postings and file ids from different builds. A file whose size or mtime no
+    longer matches the index is always a candidate, unless update() has
+    re-read it after a write by the agent. Once too many files are stale
+    the index is rebuilt in the background.
+    """
+
+    def __init__(self, file_index: FileIndex, config: TrigramIndexConfig):
+        self.file_index = file_index
+        self.config = config
+        self._dir = get_data_dir() / "trigram_index" / hashlib.sha1(str(file_index.root).encode()).hexdigest()[:16]
+        self._files: dict[str, IndexedFile] = {}
+        self._postings: Postings | None = None
+        self._overlay: dict[str, tuple[int, int, set[int]]] = {}
+        self._building: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def ready(self) -> bool:
+        return self._postings is not None
+
+    def ensure_built(self) -> None:
+        with self._lock:
+            if self._postings is None:
+                self._start_build()
+
+    def candidates(self, entries: list[FileEntry], pattern: str, flags: int = 0) -> list[FileEntry]:
+        """The entries that may contain a match for pattern."""
+        with self._lock:
+            postings, files, overlay = self._postings, self._files, dict(self._overlay)
+        if postings is None:
+            self.ensure_built()
+            return entries
+
+        query = required_literals(pattern, flags)
+        if query is None:
+            return entries
+        ids = self._evaluate(postings, query)
+        if ids is None:
+            return entries
+
+        result: list[FileEntry] = []
+        stale = 0
+        for entry in entries:
+            record = files.get(entry.path)
+            if record is not None and record.indexed and record.size == entry.size and record.mtime_ns == entry.mtime_ns:
+                if record.file_id in ids:
+                    result.append(entry)
+                continue
+
+            changed = overlay.get(entry.path)
+            if changed is not None and changed[:2] == (entry.size, entry.mtime_ns):
+                if query_matches(query, changed[2]):
+                    result.append(entry)
+                continue
+
+            stale += 1
+            result.append(entry)
+
+        if entries and stale / len(entries) > self.config.rebuild_threshold:
+            with self._lock:
+                self._start_build()
+        return result
+
+    def update(self, path: Path) -> None:
+        """Re-read one file written by the agent into the overlay."""
+        rel = self.file_index._relative(path)
+        if not rel:
+            return
+        try:
+            st = os.stat(path)
+            if st.st_size > self.config.max_file_bytes:
+                return
+            with open(path, "r", encoding="utf-8") as fp:
+                grams = text_trigrams(fp.read())
+        except (OSError, UnicodeDecodeError):
+            return
+        with self._lock:
+            self._overlay[rel] = (st.st_size, st.st_mtime_ns, grams)
+
+    def _evaluate(self, postings: Postings, query: Query) -> set[int] | None:
+        if isinstance(query, str):
+            grams = sorted(text_trigrams(query), key=lambda g: len(postings.lookup(g)))
+            if not grams:
+                return None
+            ids = set(postings.lookup(grams[0]))
+            for gram in grams[1:]:
+                if not ids:
+                    break
+                ids &= set(postings.lookup(gram))
+            return ids
+
+        kind, parts = query
+        results = [self._evaluate(postings, part) for part in parts]
+        if kind == "and":
+            known = [r for r in results if r is not None]
+            if not known:
+                return None
+            known.sort(key=len)
+            ids = known[0]
+            for other in known[1:]:
+                ids = ids & other
+            return ids
+
+        if any(r is None for r in results):
+            return None
+        return set().union(*results)
+
+    def _start_build(self) -> None:
+        if self._building is not None and self._building.is_alive():
+            return
+        self._building = threading.Thread(target=self._build, name="trigram-index", daemon=True)
+        self._building.start()
+
+    def _build(self) -> None:
+        try:
+            self.file_index.refresh(force=True)
+            entries = self.file_index.files()
+            files: dict[str, IndexedFile] = {}
+            postings: dict[int, array] = {}
+            for file_id, entry in enumerate(entries):
+                indexed = entry.size <= self.config.max_file_bytes
+                files[entry.path] = IndexedFile(file_id, entry.size, entry.mtime_ns, indexed)
+                if not indexed:
+                    continue
+                try:
+                    with open(self.file_index.root / entry.path, "r", encoding="utf-8") as fp:
+                        grams = text_trigrams(fp.read())
+                except (OSError, UnicodeDecodeError):
+                    # grep skips these too; a later change makes them stale.
+                    continue
+                for gram in grams:
+                    ids = postings.get(gram)
+                    if ids is None:
+                        ids = postings[gram] = array("I")
+                    ids.append(file_id)
+
+            self._dir.mkdir(parents=True, exist_ok=True)
+            version = Path(tempfile.mkdtemp(prefix="v-", dir=self._dir))
+            Postings.write(version / "postings.bin", postings)
+            with open(version / "files.json", "w", encoding="utf-8") as fp:
+                json.dump([[path, r.file_id, r.size, r.mtime_ns, r.indexed] for path, r in files.items()], fp)
+            loaded = Postings(version / "postings.bin")
+
+            replaced = self._current_version()
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{CURRENT_FILE}-", dir=self._dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                fp.write(version.name)
+            os.replace(tmp_path, self._dir / CURRENT_FILE)
+
+            with self._lock:
+                self._files = files
+                self._postings = loaded
+                self._overlay.clear()
+            self._remove_old_versions(version.name, replaced)
+            logger.info("Trigram index built for %s: %d files, %d trigrams", self.file_index.root, len(files), len(postings))
+        except Exception:
+            logger.exception("Failed to build trigram index for %s", self.file_index.root)
+
+    def _current_version(self) -> str | None:
+        try:
+            with open(self._dir / CURRENT_FILE, "r", encoding="utf-8") as fp:
+                return fp.read().strip() or None
+        except OSError:
+            return None
+
+    def _remove_old_versions(self, current: str, replaced: str | None) -> None:
+        # Another session may still be writing a newer version, so only the
+        # one just replaced and long-abandoned builds are removed. Sessions
+        # that mapped a removed postings.bin keep reading it on POSIX.
+        cutoff = time.time() - ORPHAN_AGE
+        for path in self._dir.iterdir():
+            if path.name == current or not path.name.startswith(("v-", f"{CURRENT_FILE}-")):
+                continue
+            try:
+                if path.name == replaced or path.stat().st_mtime < cutoff:
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink()
+            except OSError:
+                logger.debug("Could not remove old trigram index %s", path)
+
+    def _load(self) -> None:
+        version = self._current_version()
+        if version is None:
+            return
+        try:
+            with open(self._dir / version / "files.json", "r", encoding="utf-8") as fp:
+                records = json.load(fp)
+            postings = Postings(self._dir / version / "postings.bin")
+        except (OSError, ValueError):
+            return
+        self._files = {path: IndexedFile(file_id, size, mtime_ns, indexed) for path, file_id, size, mtime_ns, indexed in records}
+        self._postings = postings
+
+
+_indexes: dict[Path, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trigram_index(file_index: FileIndex, config: TrigramIndexConfig) -> TrigramIndex | None:
+    """Trigram index shared by every grep over the same root."""
+    if not config.enabled:
+        return None
+
+    with _indexes_lock:
+        index = _indexes.get(file_index.root)
+        if index is None:
+            index = TrigramIndex(file_index, config)
+            _indexes[file_index.root] = index
+        return index
+
+
+def notify_trigram_indexes(path: Path) -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.update(path)
@@ -15,8 +15,8 @@ from rich.markdown import Markdown
 import re
 from config.config import Config
 from tools.base import ToolConfirmation
-from utils.paths import display_path_rel_to_cwd
-from utils.text import truncate_text
+from utils.paths import display_path_rel_to_cwd, guess_language
+from utils.text import TruncateMode, truncate_text
 
 _console: Console | None = None
 
@@ -60,6 +60,10 @@ class TUI:
         self._assistant_stream_open = False
         self.config = config
         self._tool_args_by_call_id:dict[str,dict[str,Any]] = {}
+        # call_id -> progress lines printed so far
+        self._progress_lines_by_call_id:dict[str,int] = {}
+        self._last_progress_call_id:str|None = None
+        self._max_progress_lines = 200
         self.cwd = self.config.cwd
         self._max_block_tokens = 2500
 
@@ -151,6 +155,29 @@ class TUI:
         self.console.print()
         self.console.print(panel)
 
+    def tool_call_progress(self,call_id:str,name:str,tool_kind:str|None,output:str)->None:
+        shown = self._progress_lines_by_call_id.get(call_id,0)
+        if shown >= self._max_progress_lines:
+            return
+
+        if call_id != self._last_progress_call_id:
+            # Parallel calls interleave, so say whose output follows.
+            self.console.print(Text.assemble(
+                ("⋯ ","muted"),
+                (name,f"tool.{tool_kind}" if tool_kind else "tool"),
+                ("  ","muted"),
+                (f"#{call_id[:8]}","muted"),
+            ))
+            self._last_progress_call_id = call_id
+
+        lines = output.rstrip("\n").splitlines()
+        remaining = self._max_progress_lines-shown
+        for line in lines[:remaining]:
+            self.console.print(Text(f"  {line}",style="muted",no_wrap=True,overflow="ellipsis"))
+        if len(lines) > remaining:
+            self.console.print(Text("  …",style="muted"))
+        self._progress_lines_by_call_id[call_id] = shown+len(lines)
+
     def _extract_read_file_code(self,text:str)->tuple[int,str]|None:
         body = text
         header_match = re.match(r"^showing lines (\d+)-(\d+) of (\d+)\n\n",text)
@@ -178,35 +205,7 @@ class TUI:
     def _guess_language(self, path: str | None) -> str:
         if not path:
             return "text"
-        suffix = Path(path).suffix.lower()
-        return {
-            ".py": "python",
-            ".js": "javascript",
-            ".jsx": "jsx",
-            ".ts": "typescript",
-            ".tsx": "tsx",
-            ".json": "json",
-            ".toml": "toml",
-            ".yaml": "yaml",
-            ".yml": "yaml",
-            ".md": "markdown",
-            ".sh": "bash",
-            ".bash": "bash",
-            ".zsh": "bash",
-            ".rs": "rust",
-            ".go": "go",
-            ".java": "java",
-            ".kt": "kotlin",
-            ".swift": "swift",
-            ".c": "c",
-            ".h": "c",
-            ".cpp": "cpp",
-            ".hpp": "cpp",
-            ".css": "css",
-            ".html": "html",
-            ".xml": "xml",
-            ".sql": "sql",
-        }.get(suffix, "text")
+        return guess_language(path)
     
     def print_welcome(self, title: str, lines: list[str]) -> None:
         body = "\n".join(lines)
@@ -234,6 +233,9 @@ class TUI:
             (f"#{call_id[:8]}", "muted"),
         )
         args = self._tool_args_by_call_id.get(call_id,{})
+        # Output already shown as progress is summarized, not repeated.
+        streamed = self._progress_lines_by_call_id.pop(call_id,None) is not None
+        self._last_progress_call_id = None
 
 
         primary_path = None
@@ -300,7 +302,7 @@ class TUI:
             if exit_code is not None:
                 blocks.append(Text(f"Exit Code: {exit_code}",style="muted"))
             
-            output_display = truncate_text(output,self.config.model.name,self._max_block_tokens)
+            output_display = truncate_text(output,self.config.model.name,self._max_block_tokens,mode=TruncateMode.MIDDLE)
             blocks.append(
                 Syntax(
                     output_display,
@@ -334,42 +336,44 @@ class TUI:
             )
         elif name == "grep" and success:
             matches = metadata.get("matches")
-            file_searched = metadata.get("file_searched")
+            files_searched = metadata.get("files_searched")
             summary = []
 
             if isinstance(matches,int):
                 summary.append(f"{matches} matches")
 
-            if isinstance(file_searched,int):
-                summary.append(f"searched {file_searched} files")
+            if isinstance(files_searched,int):
+                summary.append(f"searched {files_searched} files")
 
             if summary:
                 blocks.append(Text(" • ".join(summary),style="muted"))
 
-            output_display = truncate_text(output,self.config.model.name,self._max_block_tokens)
-            blocks.append(
-                Syntax(
-                    output_display,
-                    "text",
-                    theme="monokai",
-                    word_wrap=True
+            if not streamed:
+                output_display = truncate_text(output,self.config.model.name,self._max_block_tokens)
+                blocks.append(
+                    Syntax(
+                        output_display,
+                        "text",
+                        theme="monokai",
+                        word_wrap=True
+                    )
                 )
-            )
         elif name == "glob" and success:
             matches = metadata.get("matches")
 
             if isinstance(matches,int):
                 blocks.append(Text(f"{matches} matches",style="muted"))
 
-            output_display = truncate_text(output,self.config.model.name,self._max_block_tokens)
-            blocks.append(
-                Syntax(
-                    output_display,
-                    "text",
-                    theme="monokai",
-                    word_wrap=True
+            if not streamed:
+                output_display = truncate_text(output,self.config.model.name,self._max_block_tokens)
+                blocks.append(
+                    Syntax(
+                        output_display,
+                        "text",
+                        theme="monokai",
+                        word_wrap=True
+                    )
                 )
-            )
         elif name == "web_search" and success:
             results = metadata.get("results")
             query = args.get("query")
@@ -32,4 +32,36 @@ def is_binary_file(path:str|Path)->bool:
             chunk = f.read(8192)
             return b"\x00" in chunk
     except (OSError,IOError):
-        return False
\ No newline at end of file
+        return False
+
+LANGUAGES = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "jsx",
+    ".ts": "typescript",
+    ".tsx": "tsx",
+    ".json": "json",
+    ".toml": "toml",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".md": "markdown",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".zsh": "bash",
+    ".rs": "rust",
+    ".go": "go",
+    ".java": "java",
+    ".kt": "kotlin",
+    ".swift": "swift",
+    ".c": "c",
+    ".h": "c",
+    ".cpp": "cpp",
+    ".hpp": "cpp",
+    ".css": "css",
+    ".html": "html",
+    ".xml": "xml",
+    ".sql": "sql",
+}
+
+def guess_language(path:str|Path)->str:
+    return LANGUAGES.get(Path(path).suffix.lower(),"text")
@@ -1,12 +1,40 @@
+from enum import Enum
+from functools import lru_cache
+import time
 import tiktoken
 
-def get_tokenizer(model:str):
+# Seconds before retrying an encoding that failed to load, e.g. because
+# the BPE file could not be downloaded.
+ENCODING_RETRY_INTERVAL = 60.0
+_encoding_failed_at:dict[str,float] = {}
+
+@lru_cache(maxsize=None)
+def _load_encoding(model:str):
+    # Raises when no encoding can be loaded, so failures are not cached.
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")
+
+def get_encoding(model:str):
+    failed_at = _encoding_failed_at.get(model)
+    if failed_at is not None and time.monotonic()-failed_at < ENCODING_RETRY_INTERVAL:
+        return None
+
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return encoding.encode
+        encoding = _load_encoding(model)
     except Exception:
-        encoding  = tiktoken.get_encoding("cl100k_base")
-        return encoding.encode
+        _encoding_failed_at[model] = time.monotonic()
+        return None
+
+    _encoding_failed_at.pop(model,None)
+    return encoding
+
+def get_tokenizer(model:str):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return None
+    return lambda text: encoding.encode(text, disallowed_special=())
     
 def count_tokens(text:str, model:str = "gpt-4")->int:
     tokenizer = get_tokenizer(model)
@@ -14,52 +42,106 @@ def count_tokens(text:str, model:str = "gpt-4")->int:
     if tokenizer:
         return len(tokenizer(text))
     
-    return estimate_token(text)
+    return estimate_tokens(text)
+
+def count_tokens_many(texts:list[str], model:str = "gpt-4")->list[int]:
+    encoding = get_encoding(model)
+
+    if encoding is None:
+        return [estimate_tokens(text) for text in texts]
+
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
 
-def estimate_token(text:str)->int:
+def estimate_tokens(text:str)->int:
     return max(1,len(text)//4)
 
+class TruncateMode(str,Enum):
+    HEAD = "head"
+    TAIL = "tail"
+    MIDDLE = "middle"
+
 def truncate_text(text:str,model:str,max_tokens:int,suffix:str="\n... [truncated]",    preserve_lines: bool = True,
-):
-    current_token  = count_tokens(text,model)
-    if current_token <=max_tokens:
+    mode: TruncateMode = TruncateMode.HEAD,
+)->str:
+    """Fit text into max_tokens, encoding it at most once.
+
+    Text that already fits is returned unchanged, so callers can tell
+    whether it was truncated by comparing the result with the input.
+    """
+    # A token never covers less than one UTF-8 byte, so short text fits
+    # without running the tokenizer.
+    if len(text)*4 <= max_tokens:
+        return text
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        return _truncate_estimated(text, max_tokens, suffix, preserve_lines, mode)
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
         return text
-    suffix_tokens = count_tokens(suffix,model)
-    target_tokens = max_tokens-suffix_tokens
+
+    marker_tokens = len(encoding.encode(suffix, disallowed_special=()))
+    target_tokens = max_tokens-marker_tokens
     if target_tokens <= 0:
         return suffix.strip()
 
-    if preserve_lines:
-        return _truncate_by_lines(text, target_tokens, suffix, model)
-    else:
-        return _truncate_by_chars(text, target_tokens, suffix, model)
+    if mode == TruncateMode.HEAD:
+        head = _decode_tokens(encoding, tokens[:target_tokens])
+        return _cut_head(head, preserve_lines) + suffix
 
-def _truncate_by_lines(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    lines = text.split("\n")
-    result_lines: list[str] = []
-    current_tokens = 0
+    if mode == TruncateMode.TAIL:
+        tail = _decode_tokens(encoding, tokens[-target_tokens:])
+        return suffix.strip("\n") + "\n" + _cut_tail(tail, preserve_lines)
 
-    for line in lines:
-        line_tokens = count_tokens(line + "\n", model)
-        if current_tokens + line_tokens > target_tokens:
-            break
-        result_lines.append(line)
-        current_tokens += line_tokens
+    head_tokens = target_tokens // 2
+    tail_tokens = target_tokens - head_tokens
+    head = _decode_tokens(encoding, tokens[:head_tokens])
+    tail = _decode_tokens(encoding, tokens[-tail_tokens:]) if tail_tokens else ""
+    return (
+        _cut_head(head, preserve_lines)
+        + "\n" + suffix.strip("\n") + "\n"
+        + _cut_tail(tail, preserve_lines)
+    )
 
-    if not result_lines:
-        return _truncate_by_chars(text, target_tokens, suffix, model)
+def _decode_tokens(encoding, tokens: list[int]) -> str:
+    # Token boundaries can split multi-byte characters; drop the partial
+    # bytes instead of emitting replacement characters.
+    return encoding.decode_bytes(tokens).decode("utf-8", errors="ignore")
 
-    return "\n".join(result_lines) + suffix
+def _cut_head(text: str, preserve_lines: bool) -> str:
+    if preserve_lines:
+        cut = text.rfind("\n")
+        if cut > 0:
+            return text[:cut]
+    return text
 
+def _cut_tail(text: str, preserve_lines: bool) -> str:
+    if preserve_lines:
+        cut = text.find("\n")
+        if 0 <= cut < len(text) - 1:
+            return text[cut + 1:]
+    return text
+
+def _truncate_estimated(
+    text: str, max_tokens: int, suffix: str, preserve_lines: bool, mode: TruncateMode
+) -> str:
+    target_chars = (max_tokens - estimate_tokens(suffix)) * 4
+    if target_chars <= 0:
+        return suffix.strip()
 
-def _truncate_by_chars(text: str, target_tokens: int, suffix: str, model: str) -> str:
-    low, high = 0, len(text)
+    if mode == TruncateMode.HEAD:
+        return _cut_head(text[:target_chars], preserve_lines) + suffix
 
-    while low < high:
-        mid = (low + high + 1) // 2
-        if count_tokens(text[:mid], model) <= target_tokens:
-            low = mid
-        else:
-            high = mid - 1
+    if mode == TruncateMode.TAIL:
+        return suffix.strip("\n") + "\n" + _cut_tail(text[-target_chars:], preserve_lines)
 
-    return text[:low] + suffix
\ No newline at end of file
+    head_chars = target_chars // 2
+    tail_chars = target_chars - head_chars
+    return (
+        _cut_head(text[:head_chars], preserve_lines)
+        + "\n" + suffix.strip("\n") + "\n"
+        + _cut_tail(text[-tail_chars:], preserve_lines)
+    )